@@ -6,13 +6,15 @@ from pathlib import Path
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN, GROUP_ID, ADMIN_IDS
+from config import BOT_TOKEN, GROUP_ID, ADMIN_IDS, TOPIC_IDS
 from database import db
+from database.fsm_storage import fsm_storage
 from handlers import get_all_routers
+from middlewares import AdminAccessMiddleware
 from services.scheduler import init_scheduler
-from utils.telegram_safe import send_message_safe, patch_aiogram_message_edit_text
+from services.ssh_manager import ssh_manager
+from utils.telegram_safe import OutboundRateLimit, send_message_safe, patch_aiogram_message_edit_text
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +27,7 @@ logger = logging.getLogger("sentinel")
 async def on_startup(bot: Bot):
     await db.connect()
     logger.info("Database connected")
+    await fsm_storage.load()
 
     # Add admins from config
     for aid in ADMIN_IDS:
@@ -32,10 +35,10 @@ async def on_startup(bot: Bot):
 
     # Load topic IDs from database
     topic_ids = {}
-    for key in ["vps_panel", "payments", "balance", "monitoring", "admin", "backup"]:
-        val = await db.get_setting(f"topic_{key}")
-        if val:
-            topic_ids[key] = int(val)
+    for key in TOPIC_IDS:
+        topic_id = db.settings.get(f"topic_{key}")
+        if topic_id:
+            topic_ids[key] = topic_id
 
     init_scheduler(bot, topic_ids)
     logger.info("Scheduler initialized")
@@ -68,6 +71,8 @@ async def on_startup(bot: Bot):
 
 
 async def on_shutdown(bot: Bot):
+    ssh_manager.close_all()
+    await db.flush()
     await db.close()
     logger.info("Bot stopped")
 
@@ -85,11 +90,16 @@ async def main():
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    bot.session.middleware(OutboundRateLimit())
+    dp = Dispatcher(storage=fsm_storage)
 
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
 
+    acl = AdminAccessMiddleware()
+    dp.message.outer_middleware(acl)
+    dp.callback_query.outer_middleware(acl)
+
     for router in get_all_routers():
         dp.include_router(router)
 
@@ -20,10 +20,51 @@ TOPIC_IDS = {
 }
 
 MONITOR_INTERVAL = int(os.getenv("MONITOR_INTERVAL", "300"))
+MONITOR_CONCURRENCY = int(os.getenv("MONITOR_CONCURRENCY", "32"))
+MONITOR_PROVIDER_CONCURRENCY = int(os.getenv("MONITOR_PROVIDER_CONCURRENCY", "8"))
+MONITOR_SERVER_TIMEOUT = int(os.getenv("MONITOR_SERVER_TIMEOUT", "20"))
+MONITOR_TICK_DEADLINE = int(os.getenv("MONITOR_TICK_DEADLINE", "90"))
+MONITOR_AGENT_ENABLED = os.getenv("MONITOR_AGENT_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+MONITOR_DASHBOARD_ENABLED = os.getenv("MONITOR_DASHBOARD_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+LATENCY_PROBE_INTERVAL = int(os.getenv("LATENCY_PROBE_INTERVAL", "30"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "20"))
+LATENCY_TIMEOUT = int(os.getenv("LATENCY_TIMEOUT", "5"))
+LATENCY_CONCURRENCY = int(os.getenv("LATENCY_CONCURRENCY", "64"))
+STATUS_TTL = int(os.getenv("STATUS_TTL", "60"))
+STATUS_STALE_TTL = int(os.getenv("STATUS_STALE_TTL", "1800"))
+METRICS_RETENTION_DAYS = {
+    "1m": int(os.getenv("METRICS_RETENTION_RAW_DAYS", "7")),
+    "1h": int(os.getenv("METRICS_RETENTION_HOURLY_DAYS", "90")),
+    "1d": int(os.getenv("METRICS_RETENTION_DAILY_DAYS", "730")),
+}
 ALERT_CPU_THRESHOLD = int(os.getenv("ALERT_CPU_THRESHOLD", "90"))
 ALERT_RAM_THRESHOLD = int(os.getenv("ALERT_RAM_THRESHOLD", "90"))
 ALERT_DISK_THRESHOLD = int(os.getenv("ALERT_DISK_THRESHOLD", "85"))
+ALERT_CRITICAL_THRESHOLD = int(os.getenv("ALERT_CRITICAL_THRESHOLD", "95"))
+ALERT_REPEAT_SECONDS = int(os.getenv("ALERT_REPEAT_SECONDS", "600"))
 
 REMINDER_DAYS = [int(x.strip()) for x in os.getenv("REMINDER_DAYS", "7,3,1,0").split(",")]
 
 DB_PATH = os.getenv("DB_PATH", str(BASE_DIR / "data" / "sentinel.db"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "3"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "1").strip().lower() in ("1", "true", "yes")
+DB_WRITE_BEHIND_MS = int(os.getenv("DB_WRITE_BEHIND_MS", "200"))
+DB_WRITE_BEHIND_ROWS = int(os.getenv("DB_WRITE_BEHIND_ROWS", "100"))
+DB_BACKUP_DIR = os.getenv("DB_BACKUP_DIR", str(BASE_DIR / "data" / "backups"))
+DB_BACKUP_INTERVAL_HOURS = int(os.getenv("DB_BACKUP_INTERVAL_HOURS", "24"))
+DB_BACKUP_KEEP = int(os.getenv("DB_BACKUP_KEEP", "7"))
+DB_BACKUP_PAGES = int(os.getenv("DB_BACKUP_PAGES", "256"))
+DB_BACKUP_SEND = os.getenv("DB_BACKUP_SEND", "0").strip().lower() in ("1", "true", "yes")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", str(24 * 3600)))
+
+# Outbound Telegram limits: ~30 messages/s overall, ~1/s per chat, 20/min per group
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST = int(os.getenv("TG_CHAT_BURST", "3"))
+TG_GROUP_PER_MINUTE = int(os.getenv("TG_GROUP_PER_MINUTE", "20"))
+
+SSH_BACKEND = os.getenv("SSH_BACKEND", "asyncssh").strip().lower()
+SSH_POOL_IDLE_TIMEOUT = int(os.getenv("SSH_POOL_IDLE_TIMEOUT", "900"))
+SSH_KEEPALIVE_INTERVAL = int(os.getenv("SSH_KEEPALIVE_INTERVAL", "30"))
@@ -1,22 +1,323 @@
-import aiosqlite
+import asyncio
+import itertools
+import logging
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from config import DB_PATH
+
+import aiosqlite
+
+from config import (
+    ADMIN_IDS, DB_PATH, DB_READ_POOL_SIZE, DB_MMAP_SIZE, DB_CACHE_SIZE_KB,
+    DB_WRITE_BEHIND, DB_WRITE_BEHIND_MS, DB_WRITE_BEHIND_ROWS,
+)
+from database.migrations import migrate
+from database.models import Page
+from database.settings import Settings, encode_setting
+
+logger = logging.getLogger(__name__)
+
+# Metrics history tiers: raw polls bucketed per minute, then hourly and daily rollups
+METRIC_TABLES = {"1m": "metrics_1m", "1h": "metrics_1h", "1d": "metrics_1d"}
 
 
 class Database:
+    """SQLite in WAL mode: one writer connection plus a small pool of read-only ones.
+
+    WAL lets readers run while the writer commits, so UI queries never wait
+    behind monitoring writes. Append-only writes are queued and committed in
+    batches (write-behind); everything else commits before returning.
+    """
+
     def __init__(self):
         self.db_path = DB_PATH
         self._conn = None
+        self._readers: asyncio.Queue | None = None
+        self._reader_conns: list[aiosqlite.Connection] = []
+        # Borrowed (or awaited) readers; replace_file waits for them to drain
+        self._borrowed = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # Cleared while the file is being swapped so no new reads start
+        self._open = asyncio.Event()
+        self._open.set()
+        self._write_lock = asyncio.Lock()
+        self._pending: list[tuple[str, tuple]] = []
+        self._pending_event = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+        # Config admins plus the admins table; rebuilt on every change
+        self._admin_ids: frozenset[int] = frozenset(ADMIN_IDS)
+        self.settings = Settings()
+        self._balance = 0.0
 
     async def connect(self):
+        await self._open_connections()
+        await self._load_state()
+
+    async def _open_connections(self):
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         self._conn = await aiosqlite.connect(self.db_path)
         self._conn.row_factory = aiosqlite.Row
+        await self._conn.execute("PRAGMA journal_mode = WAL")
+        # NORMAL is durable across application crashes in WAL mode; only a
+        # power loss can roll back the last commits
+        await self._conn.execute("PRAGMA synchronous = NORMAL")
+        await self._conn.execute("PRAGMA busy_timeout = 5000")
+        await self._apply_cache_pragmas(self._conn)
         await self._create_tables()
+        await migrate(self._conn)
+
+        self._readers = asyncio.Queue()
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        for _ in range(DB_READ_POOL_SIZE):
+            conn = await aiosqlite.connect(uri, uri=True)
+            conn.row_factory = aiosqlite.Row
+            await conn.execute("PRAGMA query_only = 1")
+            await conn.execute("PRAGMA busy_timeout = 5000")
+            await self._apply_cache_pragmas(conn)
+            self._reader_conns.append(conn)
+            self._readers.put_nowait(conn)
+
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _load_state(self):
+        await self._load_admins()
+        await self._load_balance()
+        await self.settings.load(await self._fetchall("SELECT key, value FROM settings"))
+
+    @staticmethod
+    async def _apply_cache_pragmas(conn: aiosqlite.Connection):
+        await conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        # Negative cache_size is in KiB rather than pages
+        await conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
 
     async def close(self):
+        if self._conn:
+            await self.flush()
+        await self._disconnect()
+
+    async def _disconnect(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        for conn in self._reader_conns:
+            await conn.close()
+        self._reader_conns.clear()
         if self._conn:
             await self._conn.close()
+            self._conn = None
+
+    async def replace_file(self, path: str):
+        """Swap the database file for ``path`` and reconnect.
+
+        Holds the write lock for the whole swap and waits until every
+        borrowed reader is back, so no statement runs against a closed
+        connection. Cached state (admins, balance, settings) is reloaded
+        from the new file.
+        """
+        async with self._write_lock:
+            self._open.clear()
+            try:
+                while self._borrowed:
+                    await self._idle.wait()
+                # Writes queued since the last flush belong to the old file
+                await self._commit_pending()
+                await self._disconnect()
+                for suffix in ("-wal", "-shm"):
+                    Path(self.db_path + suffix).unlink(missing_ok=True)
+                os.replace(path, self.db_path)
+                await self._open_connections()
+            finally:
+                self._open.set()
+        await self._load_state()
+
+    @asynccontextmanager
+    async def _reader(self):
+        """Borrow a read-only connection, or the writer when the pool is disabled."""
+        await self._open.wait()
+        # Counted before waiting on the pool so a swap also waits for queued readers
+        self._borrowed += 1
+        self._idle.clear()
+        try:
+            if not self._reader_conns:
+                yield self._conn
+                return
+            pool = self._readers
+            conn = await pool.get()
+            try:
+                yield conn
+            finally:
+                # A connection never goes back into a pool that has been replaced
+                if pool is self._readers:
+                    pool.put_nowait(conn)
+        finally:
+            self._borrowed -= 1
+            if not self._borrowed:
+                self._idle.set()
+
+    @asynccontextmanager
+    async def _writer(self, immediate=False):
+        """Exclusive use of the writer connection, committed on exit.
+
+        Queued writes are committed first, in their own transaction, so they
+        are never reordered behind later ones and a failing queued statement
+        cannot roll back the caller's write. ``immediate`` takes SQLite's
+        write lock up front (BEGIN IMMEDIATE) for read-modify-write transactions.
+        """
+        async with self._write_lock:
+            await self._commit_pending()
+            try:
+                if immediate:
+                    await self._conn.execute("BEGIN IMMEDIATE")
+                yield self._conn
+                await self._conn.commit()
+            except BaseException:
+                await self._conn.rollback()
+                raise
+
+    async def _write(self, query, params=(), durable=True):
+        """Run a single write statement.
+
+        With ``durable=False`` the statement is queued and committed with the
+        next batch instead; use it only for writes nothing reads back right away.
+        """
+        if durable or not DB_WRITE_BEHIND:
+            async with self._writer() as conn:
+                await conn.execute(query, params)
+            return
+        self._pending.append((query, params))
+        self._pending_event.set()
+        if len(self._pending) >= DB_WRITE_BEHIND_ROWS:
+            self._batch_full.set()
+
+    async def _commit_pending(self):
+        """Commit the write-behind queue; the caller holds the write lock."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._pending_event.clear()
+        self._batch_full.clear()
+        try:
+            # Consecutive inserts of the same kind go out as one executemany
+            for query, group in itertools.groupby(batch, key=lambda item: item[0]):
+                await self._conn.executemany(query, [params for _, params in group])
+            await self._conn.commit()
+            return
+        except Exception as e:
+            await self._conn.rollback()
+            logger.error(f"Write-behind batch of {len(batch)} failed ({e}); retrying one by one")
+        # Keep every statement that succeeds on its own and drop the rest
+        dropped = 0
+        for query, params in batch:
+            try:
+                await self._conn.execute(query, params)
+            except Exception as e:
+                dropped += 1
+                logger.error(f"Dropped write-behind statement {query!r}: {e}")
+        try:
+            await self._conn.commit()
+        except Exception as e:
+            await self._conn.rollback()
+            dropped = len(batch)
+            logger.error(f"Write-behind commit failed: {e}")
+        if dropped:
+            logger.error(f"Dropped {dropped} of {len(batch)} write-behind statements")
+
+    async def flush(self):
+        """Commit queued write-behind statements now."""
+        if not self._pending:
+            return
+        async with self._writer():
+            pass
+
+    async def _flush_loop(self):
+        while True:
+            await self._pending_event.wait()
+            try:
+                # Coalesce whatever arrives within the window, or until the batch is full
+                await asyncio.wait_for(self._batch_full.wait(), DB_WRITE_BEHIND_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    async def _fetchall(self, query, params=()):
+        async with self._reader() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchall()
+
+    async def _keyset_page(self, query, key, cursor=None, backward=False,
+                           descending=False, limit=20, where="", params=()) -> Page:
+        """Fetch exactly one page ordered by the ``key`` columns.
+
+        ``cursor`` is the key of the last row shown (moving forward) or of the
+        first row shown (``backward``). One extra row tells whether more rows
+        exist in the direction of travel.
+        """
+        conditions = [where] if where else []
+        params = list(params)
+        if cursor is not None:
+            # Forward in an ascending list means greater keys, and so on
+            op = ">" if descending == backward else "<"
+            conditions.append(f"({', '.join(key)}) {op} ({', '.join('?' * len(key))})")
+            params.extend(cursor)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        order = "DESC" if descending != backward else "ASC"
+        query += " ORDER BY " + ", ".join(f"{col} {order}" for col in key) + " LIMIT ?"
+        params.append(limit + 1)
+
+        rows = await self._fetchall(query, params)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        columns = [col.rsplit(".", 1)[-1] for col in key]
+        page = Page(
+            rows=rows,
+            has_prev=more if backward else cursor is not None,
+            has_next=cursor is not None if backward else more,
+        )
+        if rows:
+            page.first_key = tuple(rows[0][col] for col in columns)
+            page.last_key = tuple(rows[-1][col] for col in columns)
+        return page
+
+    async def iter_rows(self, query, key, chunk=500):
+        """Yield all rows of ``query`` in ``key`` order, ``chunk`` rows at a time.
+
+        Every chunk is its own keyset query on a pooled reader, so memory stays
+        flat and no read transaction is held open between chunks.
+        """
+        cursor = None
+        while True:
+            page = await self._keyset_page(query, key, cursor, limit=chunk)
+            if page.rows:
+                yield page.rows
+            if not page.has_next:
+                return
+            cursor = page.last_key
+
+    async def get_columns(self, query) -> list[str]:
+        async with self._reader() as conn:
+            cursor = await conn.execute(f"{query} LIMIT 0")
+            return [col[0] for col in cursor.description]
+
+    async def count_rows(self, tables) -> dict[str, int]:
+        """Row counts of several tables in one query."""
+        tables = list(tables)
+        row = await self._fetchone(
+            "SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in tables)
+        )
+        return dict(zip(tables, row))
+
+    async def _fetchone(self, query, params=()):
+        async with self._reader() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchone()
 
     async def _create_tables(self):
         await self._conn.executescript("""
@@ -76,150 +377,320 @@ class Database:
                 details TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
+
+            -- Percentages and ping are stored x10 as integers, network in bytes/s
+            CREATE TABLE IF NOT EXISTS metrics_1m (
+                server_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                cpu INTEGER NOT NULL,
+                cpu_max INTEGER NOT NULL,
+                ram INTEGER NOT NULL,
+                ram_max INTEGER NOT NULL,
+                disk INTEGER NOT NULL,
+                net_up INTEGER NOT NULL,
+                net_down INTEGER NOT NULL,
+                ping INTEGER NOT NULL,
+                samples INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (server_id, ts)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS metrics_1h (
+                server_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                cpu INTEGER NOT NULL,
+                cpu_max INTEGER NOT NULL,
+                ram INTEGER NOT NULL,
+                ram_max INTEGER NOT NULL,
+                disk INTEGER NOT NULL,
+                net_up INTEGER NOT NULL,
+                net_down INTEGER NOT NULL,
+                ping INTEGER NOT NULL,
+                samples INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (server_id, ts)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS metrics_1d (
+                server_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                cpu INTEGER NOT NULL,
+                cpu_max INTEGER NOT NULL,
+                ram INTEGER NOT NULL,
+                ram_max INTEGER NOT NULL,
+                disk INTEGER NOT NULL,
+                net_up INTEGER NOT NULL,
+                net_down INTEGER NOT NULL,
+                ping INTEGER NOT NULL,
+                samples INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (server_id, ts)
+            ) WITHOUT ROWID;
         """)
 
     # --- Servers ---
 
     async def add_server(self, name, host, port=22, username="root",
-                         auth_type="password", password=None, ssh_key=None):
-        await self._conn.execute(
-            "INSERT INTO servers (name, host, port, username, auth_type, password, ssh_key) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (name, host, port, username, auth_type, password, ssh_key)
-        )
-        await self._conn.commit()
+                         auth_type="password", password=None, ssh_key=None) -> int:
+        async with self._writer() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO servers (name, host, port, username, auth_type, password, ssh_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, host, port, username, auth_type, password, ssh_key)
+            )
+            return cursor.lastrowid
 
     async def get_servers(self):
-        cursor = await self._conn.execute("SELECT * FROM servers WHERE is_active = 1")
-        return await cursor.fetchall()
+        return await self._fetchall("SELECT * FROM servers WHERE is_active = 1")
 
     async def get_server(self, server_id):
-        cursor = await self._conn.execute("SELECT * FROM servers WHERE id = ?", (server_id,))
-        return await cursor.fetchone()
+        return await self._fetchone("SELECT * FROM servers WHERE id = ?", (server_id,))
 
     async def delete_server(self, server_id):
-        await self._conn.execute("UPDATE servers SET is_active = 0 WHERE id = ?", (server_id,))
-        await self._conn.commit()
+        await self._write("UPDATE servers SET is_active = 0 WHERE id = ?", (server_id,))
 
     async def update_server(self, server_id, **kwargs):
         sets = ", ".join(f"{k} = ?" for k in kwargs)
         values = list(kwargs.values()) + [server_id]
-        await self._conn.execute(f"UPDATE servers SET {sets} WHERE id = ?", values)
-        await self._conn.commit()
+        await self._write(f"UPDATE servers SET {sets} WHERE id = ?", values)
 
     # --- Payments ---
 
     async def add_payment(self, server_id, description, amount, due_date,
                           currency="RUB", is_recurring=1, recurring_months=1):
-        await self._conn.execute(
+        await self._write(
             "INSERT INTO payments (server_id, description, amount, due_date, currency, "
             "is_recurring, recurring_months) VALUES (?, ?, ?, ?, ?, ?, ?)",
             (server_id, description, amount, due_date, currency, is_recurring, recurring_months)
         )
-        await self._conn.commit()
 
     async def get_payments(self, active_only=True):
         query = "SELECT p.*, s.name as server_name FROM payments p LEFT JOIN servers s ON p.server_id = s.id"
         if active_only:
             query += " WHERE p.is_paid = 0"
         query += " ORDER BY p.due_date"
-        cursor = await self._conn.execute(query)
-        return await cursor.fetchall()
+        return await self._fetchall(query)
+
+    async def get_payments_page(self, cursor=None, backward=False, limit=15) -> Page:
+        """All payments by due date, oldest first; cursor is (due_date, id)."""
+        return await self._keyset_page(
+            "SELECT p.*, s.name as server_name FROM payments p LEFT JOIN servers s ON p.server_id = s.id",
+            ("p.due_date", "p.id"), cursor, backward, limit=limit,
+        )
+
+    async def get_server_payments(self, server_id, active_only=True):
+        query = "SELECT * FROM payments WHERE server_id = ?"
+        if active_only:
+            query += " AND is_paid = 0"
+        return await self._fetchall(query + " ORDER BY due_date", (server_id,))
 
     async def get_payment(self, payment_id):
-        cursor = await self._conn.execute("SELECT * FROM payments WHERE id = ?", (payment_id,))
-        return await cursor.fetchone()
+        return await self._fetchone("SELECT * FROM payments WHERE id = ?", (payment_id,))
 
     async def mark_paid(self, payment_id):
-        await self._conn.execute("UPDATE payments SET is_paid = 1 WHERE id = ?", (payment_id,))
-        await self._conn.commit()
+        await self._write("UPDATE payments SET is_paid = 1 WHERE id = ?", (payment_id,))
 
     async def update_payment_notified(self, payment_id, notified_days):
-        await self._conn.execute(
+        await self._write(
             "UPDATE payments SET notified_days = ? WHERE id = ?",
-            (notified_days, payment_id)
+            (notified_days, payment_id),
+            durable=False,
         )
-        await self._conn.commit()
+
+    async def update_payment_due(self, payment_id, due_date, reopen=False):
+        """Move the due date and reset reminders; ``reopen`` also marks it unpaid."""
+        query = "UPDATE payments SET due_date = ?, notified_days = ''"
+        if reopen:
+            query += ", is_paid = 0"
+        await self._write(query + " WHERE id = ?", (due_date, payment_id))
 
     # --- Balance ---
 
     async def get_balance(self):
-        cursor = await self._conn.execute(
-            "SELECT balance_after FROM balance_history ORDER BY id DESC LIMIT 1"
-        )
-        row = await cursor.fetchone()
-        return row["balance_after"] if row else 0.0
+        """Current balance from the in-memory mirror of the balance row."""
+        return self._balance
+
+    async def _load_balance(self):
+        row = await self._fetchone("SELECT amount FROM balance WHERE id = 1")
+        self._balance = row["amount"] if row else 0.0
 
     async def add_balance_operation(self, operation_type, amount, description=None):
-        balance_before = await self.get_balance()
-        if operation_type == "income":
-            balance_after = balance_before + amount
-        else:
-            balance_after = balance_before - amount
-        await self._conn.execute(
-            "INSERT INTO balance_history (operation_type, amount, description, balance_before, balance_after) "
-            "VALUES (?, ?, ?, ?, ?)",
-            (operation_type, amount, description, balance_before, balance_after)
-        )
-        await self._conn.commit()
+        # Balance row and history entry change in one transaction, so two
+        # concurrent operations can never start from the same balance_before
+        async with self._writer(immediate=True) as conn:
+            cursor = await conn.execute("SELECT amount FROM balance WHERE id = 1")
+            balance_before = (await cursor.fetchone())["amount"]
+            if operation_type == "income":
+                balance_after = balance_before + amount
+            else:
+                balance_after = balance_before - amount
+            await conn.execute(
+                "UPDATE balance SET amount = ?, updated_at = CURRENT_TIMESTAMP WHERE id = 1",
+                (balance_after,)
+            )
+            await conn.execute(
+                "INSERT INTO balance_history (operation_type, amount, description, balance_before, balance_after) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (operation_type, amount, description, balance_before, balance_after)
+            )
+        self._balance = balance_after
         return balance_before, balance_after
 
     async def get_balance_history(self, limit=10):
-        cursor = await self._conn.execute(
+        return await self._fetchall(
             "SELECT * FROM balance_history ORDER BY id DESC LIMIT ?", (limit,)
         )
-        return await cursor.fetchall()
+
+    async def get_balance_history_page(self, cursor=None, backward=False, limit=15) -> Page:
+        """Newest first; cursor is (id,)."""
+        return await self._keyset_page(
+            "SELECT * FROM balance_history", ("id",), cursor, backward, descending=True, limit=limit,
+        )
 
     # --- Settings ---
 
     async def get_setting(self, key, default=None):
-        cursor = await self._conn.execute("SELECT value FROM settings WHERE key = ?", (key,))
-        row = await cursor.fetchone()
-        return row["value"] if row else default
+        return self.settings.raw(key, default)
 
     async def set_setting(self, key, value):
-        await self._conn.execute(
-            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value))
-        )
-        await self._conn.commit()
+        """Write-through: the cache is updated and the row is committed before returning."""
+        value = encode_setting(value)
+        if await self.settings.update(key, value):
+            await self._write("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
 
     # --- Admins ---
 
     async def get_admins(self):
-        cursor = await self._conn.execute("SELECT * FROM admins")
-        return await cursor.fetchall()
+        return await self._fetchall("SELECT * FROM admins")
 
     async def add_admin(self, telegram_id, username=None):
-        await self._conn.execute(
+        await self._write(
             "INSERT OR IGNORE INTO admins (telegram_id, username) VALUES (?, ?)",
             (telegram_id, username)
         )
-        await self._conn.commit()
+        await self._load_admins()
 
     async def remove_admin(self, telegram_id):
-        await self._conn.execute("DELETE FROM admins WHERE telegram_id = ?", (telegram_id,))
-        await self._conn.commit()
+        await self._write("DELETE FROM admins WHERE telegram_id = ?", (telegram_id,))
+        await self._load_admins()
+
+    async def _load_admins(self):
+        rows = await self._fetchall("SELECT telegram_id FROM admins")
+        self._admin_ids = frozenset(ADMIN_IDS).union(row["telegram_id"] for row in rows)
 
     async def is_admin(self, telegram_id):
-        from config import ADMIN_IDS
-        if telegram_id in ADMIN_IDS:
-            return True
-        cursor = await self._conn.execute(
-            "SELECT 1 FROM admins WHERE telegram_id = ?", (telegram_id,)
-        )
-        return await cursor.fetchone() is not None
+        """In-memory ACL check, no I/O; kept in sync by add_admin/remove_admin."""
+        return telegram_id in self._admin_ids
 
     # --- Logs ---
 
     async def log_action(self, admin_id, action, details=None):
-        await self._conn.execute(
+        await self._write(
             "INSERT INTO action_logs (admin_id, action, details) VALUES (?, ?, ?)",
-            (admin_id, action, details)
+            (admin_id, action, details),
+            durable=False,
         )
-        await self._conn.commit()
 
     async def get_logs(self, limit=20):
-        cursor = await self._conn.execute(
+        return await self._fetchall(
             "SELECT * FROM action_logs ORDER BY id DESC LIMIT ?", (limit,)
         )
-        return await cursor.fetchall()
+
+    async def get_logs_page(self, cursor=None, backward=False, limit=20) -> Page:
+        """Newest first; cursor is (id,)."""
+        return await self._keyset_page(
+            "SELECT * FROM action_logs", ("id",), cursor, backward, descending=True, limit=limit,
+        )
+
+    # --- FSM states ---
+
+    async def get_fsm_states(self, since: int):
+        return await self._fetchall(
+            "SELECT key, state, data, updated_at FROM fsm_states WHERE updated_at >= ?", (since,)
+        )
+
+    async def save_fsm_state(self, key: str, state, data: str, updated_at: int):
+        # Lost on a crash at worst; the user just restarts the dialog
+        await self._write(
+            "INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+            "updated_at = excluded.updated_at",
+            (key, state, data, updated_at),
+            durable=False,
+        )
+
+    async def delete_fsm_state(self, key: str):
+        await self._write("DELETE FROM fsm_states WHERE key = ?", (key,), durable=False)
+
+    async def prune_fsm_states(self, before: int):
+        await self._write("DELETE FROM fsm_states WHERE updated_at < ?", (before,), durable=False)
+
+    # --- Metrics history ---
+
+    async def add_metrics_batch(self, ts: int, samples: dict[int, dict]):
+        """Store one poll of every server in a single transaction."""
+        bucket = ts - ts % 60
+        rows = []
+        for server_id, m in samples.items():
+            cpu = round(m.get("cpu_percent", 0) * 10)
+            ram = round(m.get("ram_percent", 0) * 10)
+            rows.append((
+                server_id, bucket, cpu, cpu, ram, ram,
+                round(m.get("disk_percent", 0) * 10),
+                round(m.get("net_upload", 0)),
+                round(m.get("net_download", 0)),
+                round(m.get("ping_ms", 0) * 10),
+            ))
+        if not rows:
+            return
+        async with self._writer() as conn:
+            await conn.executemany(
+                "INSERT OR REPLACE INTO metrics_1m (server_id, ts, cpu, cpu_max, ram, ram_max, disk, "
+                "net_up, net_down, ping, samples) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+                rows,
+            )
+
+    async def rollup_metrics(self, now: int, retention_days: dict[str, int]):
+        """Recompute closed hourly and daily buckets (idempotent).
+
+        Starts at the newest bucket already rolled up (at least the last three
+        closed ones), so hours missed while the bot was down are caught up as
+        long as their source rows are still retained.
+        """
+        async with self._writer() as conn:
+            for src_res, dst_res, step in (("1m", "1h", 3600), ("1h", "1d", 86400)):
+                src, dst = METRIC_TABLES[src_res], METRIC_TABLES[dst_res]
+                current = now - now % step
+                cursor = await conn.execute(f"SELECT MAX(ts) FROM {dst}")
+                newest = (await cursor.fetchone())[0]
+                if newest is None:
+                    cursor = await conn.execute(f"SELECT MIN(ts) FROM {src}")
+                    newest = (await cursor.fetchone())[0]
+                    if newest is None:
+                        continue
+                start = min(current - 3 * step, newest - newest % step)
+                # Never rebuild a bucket whose source rows are partly pruned
+                cutoff = now - retention_days[src_res] * 86400
+                start = max(start, -(-cutoff // step) * step)
+                await conn.execute(
+                    f"INSERT OR REPLACE INTO {dst} (server_id, ts, cpu, cpu_max, ram, ram_max, disk, "
+                    f"net_up, net_down, ping, samples) "
+                    f"SELECT server_id, ts / {step} * {step}, "
+                    f"SUM(cpu * samples) / SUM(samples), MAX(cpu_max), "
+                    f"SUM(ram * samples) / SUM(samples), MAX(ram_max), "
+                    f"SUM(disk * samples) / SUM(samples), "
+                    f"SUM(net_up * samples) / SUM(samples), SUM(net_down * samples) / SUM(samples), "
+                    f"SUM(ping * samples) / SUM(samples), SUM(samples) "
+                    f"FROM {src} WHERE ts >= ? AND ts < ? GROUP BY server_id, ts / {step}",
+                    (start, current),
+                )
+
+    async def prune_metrics(self, now: int, retention_days: dict[str, int]):
+        async with self._writer() as conn:
+            for resolution, days in retention_days.items():
+                await conn.execute(
+                    f"DELETE FROM {METRIC_TABLES[resolution]} WHERE ts < ?", (now - days * 86400,)
+                )
+
+    async def get_metrics_history(self, server_id, since: int, resolution="1m"):
+        return await self._fetchall(
+            f"SELECT * FROM {METRIC_TABLES[resolution]} WHERE server_id = ? AND ts >= ? ORDER BY ts",
+            (server_id, since),
+        )
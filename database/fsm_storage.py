@@ -0,0 +1,103 @@
+import json
+import logging
+import time
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from config import FSM_STATE_TTL
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Dialog fields that hold credentials: kept in memory for the dialog, never
+# written to fsm_states (and so never to backups or exports)
+SECRET_FIELDS = frozenset({"password", "ssh_key"})
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage persisted in the fsm_states table.
+
+    Memory holds every live state and answers all reads; changes go to
+    SQLite through the write-behind queue, so a step of a dialog never waits
+    for a commit. States untouched for FSM_STATE_TTL seconds expire.
+    SECRET_FIELDS are left out of the stored data, so a dialog that asked for
+    one resumes after a restart without it.
+    """
+
+    def __init__(self, ttl: int = FSM_STATE_TTL):
+        self.ttl = ttl
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # storage key -> (state, data, updated_at)
+        self._states: dict[str, tuple[str | None, dict[str, Any], int]] = {}
+
+    async def load(self):
+        """Read the states that have not expired; call once the database is connected."""
+        now = int(time.time())
+        self._states = {}
+        for row in await db.get_fsm_states(now - self.ttl):
+            try:
+                data = json.loads(row["data"])
+            except ValueError:
+                logger.warning(f"Dropping unreadable FSM data for {row['key']}")
+                continue
+            if SECRET_FIELDS & data.keys():
+                # Stored before secrets were filtered out: scrub the row
+                data = {field: value for field, value in data.items() if field not in SECRET_FIELDS}
+                await db.save_fsm_state(row["key"], row["state"], self._dump(data), row["updated_at"])
+            self._states[row["key"]] = (row["state"], data, row["updated_at"])
+        await db.prune_fsm_states(now - self.ttl)
+        logger.info(f"Restored {len(self._states)} FSM states")
+
+    def _get(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        entry = self._states.get(self._key_builder.build(key))
+        if entry is None or entry[2] < time.time() - self.ttl:
+            return None, {}
+        return entry[0], entry[1]
+
+    async def _put(self, key: StorageKey, state: str | None, data: dict[str, Any]):
+        storage_key = self._key_builder.build(key)
+        if state is None and not data:
+            if self._states.pop(storage_key, None) is not None:
+                await db.delete_fsm_state(storage_key)
+            return
+        now = int(time.time())
+        self._states[storage_key] = (state, data, now)
+        await db.save_fsm_state(storage_key, state, self._dump(data), now)
+
+    @staticmethod
+    def _dump(data: dict[str, Any]) -> str:
+        return json.dumps(
+            {field: value for field, value in data.items() if field not in SECRET_FIELDS}, ensure_ascii=False
+        )
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        if isinstance(state, State):
+            state = state.state
+        await self._put(key, state, self._get(key)[1])
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return self._get(key)[0]
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await self._put(key, self._get(key)[0], data.copy())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return self._get(key)[1].copy()
+
+    async def expire(self):
+        """Drop states untouched for longer than the TTL."""
+        cutoff = int(time.time()) - self.ttl
+        stale = [key for key, entry in self._states.items() if entry[2] < cutoff]
+        for key in stale:
+            del self._states[key]
+        await db.prune_fsm_states(cutoff)
+        if stale:
+            logger.info(f"Expired {len(stale)} FSM states")
+
+    async def close(self) -> None:
+        await db.flush()
+
+
+fsm_storage = SQLiteStorage()
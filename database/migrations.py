@@ -0,0 +1,71 @@
+"""Versioned schema migrations.
+
+``_create_tables`` is the version 0 baseline. Every entry below runs once,
+in order, inside its own transaction and is recorded in ``schema_version``.
+Shipped migrations are never edited; schema changes append a new entry.
+"""
+import logging
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: list[tuple[int, str, tuple[str, ...]]] = [
+    (1, "payment and action log indexes", (
+        # get_payments / reminder job: unpaid first, ordered by due date
+        "CREATE INDEX IF NOT EXISTS idx_payments_paid_due ON payments (is_paid, due_date)",
+        # server card: active payments of one server
+        "CREATE INDEX IF NOT EXISTS idx_payments_server_paid ON payments (server_id, is_paid)",
+        "CREATE INDEX IF NOT EXISTS idx_action_logs_created ON action_logs (created_at)",
+    )),
+    (2, "materialized balance", (
+        "CREATE TABLE IF NOT EXISTS balance ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1), amount REAL NOT NULL, "
+        "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        # Seed from the last history entry, the old source of truth
+        "INSERT OR IGNORE INTO balance (id, amount) SELECT 1, COALESCE("
+        "(SELECT balance_after FROM balance_history ORDER BY id DESC LIMIT 1), 0)",
+    )),
+    (3, "payment history keyset index", (
+        # (due_date, rowid) serves the paginated history in both directions
+        "CREATE INDEX IF NOT EXISTS idx_payments_due ON payments (due_date)",
+    )),
+    (4, "persistent FSM storage", (
+        "CREATE TABLE IF NOT EXISTS fsm_states ("
+        "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', "
+        "updated_at INTEGER NOT NULL) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)",
+    )),
+]
+
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    """Apply pending migrations and return the resulting schema version."""
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    await conn.commit()
+    cursor = await conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = (await cursor.fetchone())[0]
+
+    for version, name, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            # Explicit BEGIN: sqlite3 would otherwise autocommit each DDL statement
+            await conn.execute("BEGIN")
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name)
+            )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            logger.error(f"Migration {version} ({name}) failed")
+            raise
+        logger.info(f"Applied migration {version}: {name}")
+        current = version
+    return current
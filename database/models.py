@@ -1,7 +1,7 @@
 # Database models are defined as SQL in database/db.py
 # This file provides dataclass representations for type hints
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 
@@ -40,3 +40,13 @@ class BalanceRecord:
     description: Optional[str]
     balance_before: float
     balance_after: float
+
+
+@dataclass
+class Page:
+    """One keyset page; cursors are the sort keys of the first and last row."""
+    rows: list = field(default_factory=list)
+    has_prev: bool = False
+    has_next: bool = False
+    first_key: Optional[tuple] = None
+    last_key: Optional[tuple] = None
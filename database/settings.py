@@ -0,0 +1,80 @@
+import inspect
+import logging
+from collections import defaultdict
+from typing import Any, Callable
+
+from config import TOPIC_IDS
+
+logger = logging.getLogger(__name__)
+
+# key -> (type, default); values are stored as text in the settings table
+SETTINGS_SCHEMA: dict[str, tuple[type, Any]] = {
+    "monitor_enabled": (bool, True),
+    "payment_notify_enabled": (bool, True),
+    "group_id": (int, 0),
+    # pinned fleet dashboard in the monitoring topic
+    "dashboard_message_id": (int, 0),
+    **{f"topic_{key}": (int, 0) for key in TOPIC_IDS},
+}
+
+
+def encode_setting(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return "" if value is None else str(value)
+
+
+class Settings:
+    """In-memory copy of the settings table with typed access and change hooks.
+
+    Database loads it once on connect and writes through it in set_setting,
+    so reads never touch SQLite.
+    """
+
+    def __init__(self):
+        self._values: dict[str, str] = {}
+        self._subscribers: dict[str, list[Callable]] = defaultdict(list)
+
+    async def load(self, rows):
+        """Replace all values; subscribers hear about every key that changed."""
+        values = {row["key"]: row["value"] for row in rows}
+        for key in self._values.keys() - values.keys():
+            await self.update(key, "")
+        for key, value in values.items():
+            await self.update(key, value)
+
+    def raw(self, key: str, default=None) -> str | None:
+        return self._values.get(key, default)
+
+    def get(self, key: str):
+        """Value converted to its schema type; the schema default when unset or empty."""
+        kind, default = SETTINGS_SCHEMA[key]
+        value = self._values.get(key)
+        if value is None or value == "":
+            return default
+        if kind is bool:
+            return value == "1"
+        try:
+            return kind(value)
+        except ValueError:
+            logger.warning(f"Bad value for setting {key}: {value!r}")
+            return default
+
+    def subscribe(self, key: str, callback: Callable):
+        """Call ``callback(key, value)`` (sync or async) after the setting changes."""
+        self._subscribers[key].append(callback)
+
+    async def update(self, key: str, value: str) -> bool:
+        """Store a new raw value and notify subscribers; False when nothing changed."""
+        if self._values.get(key) == value:
+            return False
+        self._values[key] = value
+        typed = self.get(key) if key in SETTINGS_SCHEMA else value
+        for callback in self._subscribers.get(key, ()):
+            try:
+                result = callback(key, typed)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Settings subscriber for {key} failed: {e}")
+        return True
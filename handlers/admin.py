@@ -1,13 +1,29 @@
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import datetime
+
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, FSInputFile, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from database import db
-from keyboards.inline import admin_kb, admin_topic_kb, back_kb
+from keyboards.inline import (
+    admin_kb, admin_topic_kb, back_kb, db_backups_kb, db_restore_confirm_kb, export_kb,
+    outbound_stats_kb, pager_kb,
+)
 from config import ADMIN_IDS
-from utils.telegram_safe import edit_message_text_safe
-
+from services.db_backup import create_backup, list_backups, restore_backup
+from services.exporter import EXPORT_FORMATS, export_counts, export_data, export_suffix
+from utils.telegram_safe import (
+    MAX_DOCUMENT_BYTES, Priority, edit_cache_stats, edit_message_text_safe, outbound_dispatcher,
+    outbound_limiter, outbound_priority,
+)
+
+logger = logging.getLogger(__name__)
 router = Router()
 
 
@@ -162,11 +178,8 @@ async def cb_notifications(callback: CallbackQuery):
         await _safe_callback_answer(callback, "\u26d4", show_alert=True)
         return
 
-    monitor_enabled = await db.get_setting("monitor_enabled", "1")
-    payment_enabled = await db.get_setting("payment_notify_enabled", "1")
-
-    mon_status = "\U0001f7e2 \u0412\u043a\u043b" if monitor_enabled == "1" else "\U0001f534 \u0412\u044b\u043a\u043b"
-    pay_status = "\U0001f7e2 \u0412\u043a\u043b" if payment_enabled == "1" else "\U0001f534 \u0412\u044b\u043a\u043b"
+    mon_status = "\U0001f7e2 \u0412\u043a\u043b" if db.settings.get("monitor_enabled") else "\U0001f534 \u0412\u044b\u043a\u043b"
+    pay_status = "\U0001f7e2 \u0412\u043a\u043b" if db.settings.get("payment_notify_enabled") else "\U0001f534 \u0412\u044b\u043a\u043b"
 
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -196,24 +209,29 @@ async def cb_toggle_setting(callback: CallbackQuery):
         return
 
     key = callback.data.split(":")[2]
-    current = await db.get_setting(key, "1")
-    new_val = "0" if current == "1" else "1"
+    if key not in ("monitor_enabled", "payment_notify_enabled"):
+        await _safe_callback_answer(callback)
+        return
+    new_val = not db.settings.get(key)
     await db.set_setting(key, new_val)
 
-    await db.log_action(callback.from_user.id, f"toggle_{key}", new_val)
+    await db.log_action(callback.from_user.id, f"toggle_{key}", "1" if new_val else "0")
     await cb_notifications(callback)
 
 
 # === Action Logs ===
 
-@router.callback_query(F.data == "adm:logs")
+@router.callback_query(F.data.startswith("adm:logs"))
 async def cb_logs(callback: CallbackQuery):
     if not await db.is_admin(callback.from_user.id):
         await _safe_callback_answer(callback, "\u26d4", show_alert=True)
         return
 
-    logs = await db.get_logs(limit=20)
-    if not logs:
+    # adm:logs[:p|n:id]
+    parts = callback.data.split(":")
+    cursor = (int(parts[3]),) if len(parts) == 4 else None
+    page = await db.get_logs_page(cursor, backward=len(parts) == 4 and parts[2] == "p")
+    if not page.rows:
         await callback.message.edit_text(
             "\U0001f4cb <b>\u041b\u043e\u0433\u0438 \u0434\u0435\u0439\u0441\u0442\u0432\u0438\u0439</b>\n\n\u041f\u0443\u0441\u0442\u043e.",
             reply_markup=back_kb("menu:admin"),
@@ -223,37 +241,224 @@ async def cb_logs(callback: CallbackQuery):
         return
 
     text = "\U0001f4cb <b>\u041b\u043e\u0433\u0438 \u0434\u0435\u0439\u0441\u0442\u0432\u0438\u0439</b>\n\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n\n"
-    for log in logs:
+    for log in page.rows:
         details = f" ({log['details']})" if log["details"] else ""
         text += f"\U0001f4cc {log['action']}{details}\n   \U0001f464 {log['admin_id']} \u2022 {log['created_at'][:16]}\n\n"
 
     await callback.message.edit_text(
-        text, reply_markup=back_kb("menu:admin"), parse_mode="HTML"
+        text, reply_markup=pager_kb("adm:logs", page, "menu:admin"), parse_mode="HTML"
     )
     await _safe_callback_answer(callback)
 
 
 # === Export ===
 
+_export_lock = asyncio.Lock()
+
+_EXPORT_LABELS = {
+    "servers": "\U0001f5a5 \u0421\u0435\u0440\u0432\u0435\u0440\u043e\u0432",
+    "payments": "\U0001f4b0 \u041f\u043b\u0430\u0442\u0435\u0436\u0435\u0439",
+    "balance_history": "\U0001f4b3 \u041e\u043f\u0435\u0440\u0430\u0446\u0438\u0439 \u0431\u0430\u043b\u0430\u043d\u0441\u0430",
+    "action_logs": "\U0001f4cb \u0417\u0430\u043f\u0438\u0441\u0435\u0439 \u0432 \u043b\u043e\u0433\u0430\u0445",
+    "metrics_1m": "\U0001f4c8 \u041c\u0435\u0442\u0440\u0438\u043a (1 \u043c\u0438\u043d)",
+    "metrics_1h": "\U0001f4c8 \u041c\u0435\u0442\u0440\u0438\u043a (1 \u0447\u0430\u0441)",
+    "metrics_1d": "\U0001f4c8 \u041c\u0435\u0442\u0440\u0438\u043a (1 \u0434\u0435\u043d\u044c)",
+}
+
+
+def _export_summary(counts: dict[str, int]) -> str:
+    return "".join(f"{_EXPORT_LABELS[table]}: {count}\n" for table, count in counts.items())
+
+
 @router.callback_query(F.data == "adm:export")
 async def cb_export(callback: CallbackQuery):
     if not await db.is_admin(callback.from_user.id):
         await _safe_callback_answer(callback, "\u26d4", show_alert=True)
         return
 
-    servers = await db.get_servers()
-    payments = await db.get_payments(active_only=False)
+    counts = await export_counts()
     balance = await db.get_balance()
 
     text = (
         "\U0001f4e4 <b>\u042d\u043a\u0441\u043f\u043e\u0440\u0442 \u0434\u0430\u043d\u043d\u044b\u0445</b>\n"
         "\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n\n"
-        f"\U0001f5a5 \u0421\u0435\u0440\u0432\u0435\u0440\u043e\u0432: {len(list(servers))}\n"
-        f"\U0001f4b0 \u041f\u043b\u0430\u0442\u0435\u0436\u0435\u0439: {len(list(payments))}\n"
-        f"\U0001f4b3 \u0411\u0430\u043b\u0430\u043d\u0441: {balance:.2f}\u20bd\n"
+        f"{_export_summary(counts)}"
+        f"\U0001f4b3 \u0411\u0430\u043b\u0430\u043d\u0441: {balance:.2f}\u20bd\n\n"
+        "\u0412\u044b\u0431\u0435\u0440\u0438\u0442\u0435 \u0444\u043e\u0440\u043c\u0430\u0442 \u0444\u0430\u0439\u043b\u0430:"
+    )
+
+    await callback.message.edit_text(
+        text, reply_markup=export_kb(), parse_mode="HTML"
+    )
+    await _safe_callback_answer(callback)
+
+
+@router.callback_query(F.data.startswith("adm:export:"))
+async def cb_export_file(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
+
+    fmt = callback.data.split(":")[2]
+    if fmt not in EXPORT_FORMATS:
+        await _safe_callback_answer(callback)
+        return
+    if _export_lock.locked():
+        await _safe_callback_answer(callback, "\u23f3 \u042d\u043a\u0441\u043f\u043e\u0440\u0442 \u0443\u0436\u0435 \u0432\u044b\u043f\u043e\u043b\u043d\u044f\u0435\u0442\u0441\u044f", show_alert=True)
+        return
+
+    await _safe_callback_answer(callback, "\u23f3 \u0413\u043e\u0442\u043e\u0432\u043b\u044e \u0444\u0430\u0439\u043b...")
+    async with _export_lock:
+        filename = f"sentinel-{datetime.now():%Y%m%d-%H%M}{export_suffix(fmt)}"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, filename)
+            try:
+                written = await export_data(fmt, path)
+            except Exception as e:
+                logger.error(f"Export to {fmt} failed: {e}")
+                await callback.message.answer(f"\u274c \u041e\u0448\u0438\u0431\u043a\u0430 \u044d\u043a\u0441\u043f\u043e\u0440\u0442\u0430: {e}")
+                return
+
+            size = os.path.getsize(path)
+            if size > MAX_DOCUMENT_BYTES:
+                await callback.message.answer(
+                    f"\u274c \u0424\u0430\u0439\u043b \u0441\u043b\u0438\u0448\u043a\u043e\u043c \u0431\u043e\u043b\u044c\u0448\u043e\u0439 \u0434\u043b\u044f Telegram: {size / 1024 / 1024:.1f} \u041c\u0411"
+                )
+                return
+            with outbound_priority(Priority.BULK):
+                await callback.message.answer_document(
+                    FSInputFile(path, filename=filename),
+                    caption=f"\U0001f4e4 <b>\u042d\u043a\u0441\u043f\u043e\u0440\u0442 \u0434\u0430\u043d\u043d\u044b\u0445</b> ({fmt.upper()})\n\n{_export_summary(written)}",
+                    parse_mode="HTML",
+                )
+    await db.log_action(callback.from_user.id, "export", fmt)
+
+
+# === Database backups ===
+
+_BACKUPS_SHOWN = 10
+
+
+def _backups_text() -> tuple[str, list[str]]:
+    backups = list_backups()[:_BACKUPS_SHOWN]
+    text = "\U0001f4be <b>\u0411\u044d\u043a\u0430\u043f\u044b \u0431\u0430\u0437\u044b \u0434\u0430\u043d\u043d\u044b\u0445</b>\n\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n\n"
+    if not backups:
+        text += "\u0411\u044d\u043a\u0430\u043f\u043e\u0432 \u043f\u043e\u043a\u0430 \u043d\u0435\u0442.\n"
+    for path in backups:
+        text += f"\U0001f4e6 <code>{path.name}</code> \u2022 {path.stat().st_size / 1024:.0f} \u041a\u0411\n"
+    text += "\n\u041d\u0430\u0436\u043c\u0438\u0442\u0435 \u043d\u0430 \u0431\u044d\u043a\u0430\u043f, \u0447\u0442\u043e\u0431\u044b \u0432\u043e\u0441\u0441\u0442\u0430\u043d\u043e\u0432\u0438\u0442\u044c \u0431\u0430\u0437\u0443 \u0438\u0437 \u043d\u0435\u0433\u043e."
+    return text, [path.name for path in backups]
+
+
+@router.callback_query(F.data == "adm:backups")
+async def cb_backups(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
+
+    text, names = _backups_text()
+    await callback.message.edit_text(text, reply_markup=db_backups_kb(names), parse_mode="HTML")
+    await _safe_callback_answer(callback)
+
+
+@router.message(Command("restore"))
+async def cmd_restore(message: Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+    text, names = _backups_text()
+    await message.answer(text, reply_markup=db_backups_kb(names), parse_mode="HTML")
+
+
+@router.callback_query(F.data == "adm:backups:run")
+async def cb_backup_run(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
+
+    await _safe_callback_answer(callback, "\u23f3 \u0421\u043e\u0437\u0434\u0430\u044e \u0431\u044d\u043a\u0430\u043f...")
+    try:
+        archive = await create_backup()
+    except Exception as e:
+        logger.error(f"Manual backup failed: {e}")
+        await callback.message.answer(f"\u274c \u041e\u0448\u0438\u0431\u043a\u0430 \u0431\u044d\u043a\u0430\u043f\u0430: {e}")
+        return
+    await db.log_action(callback.from_user.id, "db_backup", archive.name)
+
+    text, names = _backups_text()
+    await callback.message.edit_text(text, reply_markup=db_backups_kb(names), parse_mode="HTML")
+
+
+@router.callback_query(F.data.startswith("adm:restore:"))
+async def cb_restore(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
+
+    name = callback.data.split(":", 2)[2]
+    await callback.message.edit_text(
+        f"\u267b\ufe0f <b>\u0412\u043e\u0441\u0441\u0442\u0430\u043d\u043e\u0432\u043b\u0435\u043d\u0438\u0435 \u0431\u0430\u0437\u044b</b>\n\n"
+        f"\u0422\u0435\u043a\u0443\u0449\u0430\u044f \u0431\u0430\u0437\u0430 \u0431\u0443\u0434\u0435\u0442 \u0437\u0430\u043c\u0435\u043d\u0435\u043d\u0430 \u043d\u0430 <code>{name}</code>.\n"
+        f"\u041f\u0435\u0440\u0435\u0434 \u0437\u0430\u043c\u0435\u043d\u043e\u0439 \u0430\u0440\u0445\u0438\u0432 \u043f\u0440\u043e\u0432\u0435\u0440\u044f\u0435\u0442\u0441\u044f, \u0430 \u0442\u0435\u043a\u0443\u0449\u0430\u044f \u0431\u0430\u0437\u0430 \u0441\u043e\u0445\u0440\u0430\u043d\u044f\u0435\u0442\u0441\u044f \u0432 \u043d\u043e\u0432\u044b\u0439 \u0431\u044d\u043a\u0430\u043f.",
+        reply_markup=db_restore_confirm_kb(name),
+        parse_mode="HTML",
     )
+    await _safe_callback_answer(callback)
+
+
+@router.callback_query(F.data.startswith("adm:restore_ok:"))
+async def cb_restore_confirm(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
 
+    name = callback.data.split(":", 2)[2]
+    await _safe_callback_answer(callback, "\u23f3 \u0412\u043e\u0441\u0441\u0442\u0430\u043d\u0430\u0432\u043b\u0438\u0432\u0430\u044e...")
+    try:
+        await restore_backup(name)
+    except Exception as e:
+        logger.error(f"Restore from {name} failed: {e}")
+        await callback.message.edit_text(
+            f"\u274c <b>\u0412\u043e\u0441\u0441\u0442\u0430\u043d\u043e\u0432\u043b\u0435\u043d\u0438\u0435 \u043e\u0442\u043c\u0435\u043d\u0435\u043d\u043e</b>\n\n{e}",
+            reply_markup=back_kb("adm:backups"),
+            parse_mode="HTML",
+        )
+        return
+    await db.log_action(callback.from_user.id, "db_restore", name)
     await callback.message.edit_text(
-        text, reply_markup=back_kb("menu:admin"), parse_mode="HTML"
+        f"\u2705 \u0411\u0430\u0437\u0430 \u0432\u043e\u0441\u0441\u0442\u0430\u043d\u043e\u0432\u043b\u0435\u043d\u0430 \u0438\u0437 <code>{name}</code>",
+        reply_markup=back_kb("adm:backups"),
+        parse_mode="HTML",
+    )
+
+
+# === Outbound stats ===
+
+_PRIORITY_LABELS = {
+    Priority.ALERT: "\U0001f6a8 \u0410\u043b\u0435\u0440\u0442\u044b",
+    Priority.REMINDER: "\u23f0 \u041d\u0430\u043f\u043e\u043c\u0438\u043d\u0430\u043d\u0438\u044f",
+    Priority.INTERACTIVE: "\U0001f5b1 \u0418\u043d\u0442\u0435\u0440\u0444\u0435\u0439\u0441",
+    Priority.BULK: "\U0001f4e6 \u0424\u0430\u0439\u043b\u044b \u0438 \u043e\u0442\u0447\u0451\u0442\u044b",
+}
+
+
+@router.callback_query(F.data == "adm:stats")
+async def cb_outbound_stats(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
+
+    edits = edit_cache_stats()
+    text = "\U0001f4ca <b>\u041e\u0447\u0435\u0440\u0435\u0434\u044c \u043e\u0442\u043f\u0440\u0430\u0432\u043a\u0438</b>\n\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n\n"
+    for priority, stats in outbound_dispatcher.stats().items():
+        text += (
+            f"{_PRIORITY_LABELS[priority]}: {stats['sent']} \u043e\u0442\u043f\u0440., \u0432 \u043e\u0447\u0435\u0440\u0435\u0434\u0438 {stats['queued']}\n"
+            f"   \u23f1 p50 {stats['p50_ms']:.0f} \u043c\u0441 \u2022 p95 {stats['p95_ms']:.0f} \u043c\u0441 \u2022 max {stats['max_ms']:.0f} \u043c\u0441\n"
+        )
+    text += (
+        f"\n\U0001f6a6 \u041e\u0436\u0438\u0434\u0430\u043d\u0438\u0439 \u043b\u0438\u043c\u0438\u0442\u043e\u0432 Telegram: {outbound_limiter.throttled} "
+        f"({outbound_limiter.wait_seconds:.1f} \u0441)\n"
+        f"\u267b\ufe0f \u041f\u0440\u043e\u043f\u0443\u0449\u0435\u043d\u043e \u043f\u0440\u0430\u0432\u043e\u043a \u0431\u0435\u0437 \u0438\u0437\u043c\u0435\u043d\u0435\u043d\u0438\u0439: {edits['hits']} \u0438\u0437 {edits['hits'] + edits['misses']}\n"
     )
+
+    await callback.message.edit_text(text, reply_markup=outbound_stats_kb(), parse_mode="HTML")
     await _safe_callback_answer(callback)
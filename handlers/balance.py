@@ -4,7 +4,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from database import db
-from keyboards.inline import balance_kb, balance_topic_kb, back_kb
+from keyboards.inline import balance_kb, balance_topic_kb, back_kb, pager_kb
 from utils.telegram_safe import edit_message_text_safe
 from utils.formatters import format_balance_report, format_money
 
@@ -225,14 +225,17 @@ async def fsm_balance_desc(message: Message, state: FSMContext):
 
 # === History ===
 
-@router.callback_query(F.data == "bal:history")
+@router.callback_query(F.data.startswith("bal:history"))
 async def cb_balance_history(callback: CallbackQuery):
     if not await db.is_admin(callback.from_user.id):
         await _safe_callback_answer(callback, "\u26d4", show_alert=True)
         return
 
-    history = await db.get_balance_history(limit=15)
-    if not history:
+    # bal:history[:p|n:id]
+    parts = callback.data.split(":")
+    cursor = (int(parts[3]),) if len(parts) == 4 else None
+    page = await db.get_balance_history_page(cursor, backward=len(parts) == 4 and parts[2] == "p")
+    if not page.rows:
         await callback.message.edit_text(
             "\U0001f4dc <b>\u0418\u0441\u0442\u043e\u0440\u0438\u044f \u043e\u043f\u0435\u0440\u0430\u0446\u0438\u0439</b>\n\n\u041f\u0443\u0441\u0442\u043e.",
             reply_markup=back_kb("menu:balance"),
@@ -244,7 +247,7 @@ async def cb_balance_history(callback: CallbackQuery):
     op_icons = {"income": "\U0001f4e5", "expense": "\U0001f4e4", "payment": "\U0001f9fe"}
     text = "\U0001f4dc <b>\u0418\u0441\u0442\u043e\u0440\u0438\u044f \u043e\u043f\u0435\u0440\u0430\u0446\u0438\u0439</b>\n\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n\n"
 
-    for h in history:
+    for h in page.rows:
         icon = op_icons.get(h["operation_type"], "\U0001f4b0")
         desc = h["description"] or ""
         text += f"{icon} {format_money(h['amount'])} \u2192 {format_money(h['balance_after'])}"
@@ -253,6 +256,6 @@ async def cb_balance_history(callback: CallbackQuery):
         text += f"\n   {h['created_at'][:16]}\n\n"
 
     await callback.message.edit_text(
-        text, reply_markup=back_kb("menu:balance"), parse_mode="HTML"
+        text, reply_markup=pager_kb("bal:history", page, "menu:balance"), parse_mode="HTML"
     )
     await _safe_callback_answer(callback)
@@ -4,7 +4,7 @@ from aiogram.types import CallbackQuery
 from database import db
 from keyboards.inline import monitoring_kb, monitoring_topic_kb, monitoring_server_kb, back_kb
 from services.monitoring_service import monitoring_service
-from utils.formatters import format_server_status
+from utils.formatters import format_server_status, format_metrics_history
 
 router = Router()
 
@@ -98,6 +98,39 @@ async def cb_refresh_server(callback: CallbackQuery):
     )
 
 
+# === History ===
+
+HISTORY_PERIODS = [
+    ("24 \u0447\u0430\u0441\u0430", 86400),
+    ("7 \u0434\u043d\u0435\u0439", 7 * 86400),
+    ("30 \u0434\u043d\u0435\u0439", 30 * 86400),
+]
+
+
+@router.callback_query(F.data.startswith("mon:history:"))
+async def cb_server_history(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
+
+    server_id = int(callback.data.split(":")[2])
+    server = await db.get_server(server_id)
+    if not server:
+        await _safe_callback_answer(callback, "\u041d\u0435 \u043d\u0430\u0439\u0434\u0435\u043d", show_alert=True)
+        return
+
+    summaries = [
+        (label, await monitoring_service.get_history_summary(server_id, period))
+        for label, period in HISTORY_PERIODS
+    ]
+    await callback.message.edit_text(
+        format_metrics_history(dict(server), summaries),
+        reply_markup=back_kb(f"mon:server:{server_id}"),
+        parse_mode="HTML",
+    )
+    await _safe_callback_answer(callback)
+
+
 # === Refresh All ===
 
 @router.callback_query(F.data == "mon:refresh_all")
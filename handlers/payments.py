@@ -5,7 +5,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from database import db
-from keyboards.inline import payments_kb, payments_topic_kb, back_kb, confirm_kb
+from keyboards.inline import payments_kb, payments_topic_kb, back_kb, confirm_kb, pager_kb
 from utils.telegram_safe import edit_message_text_safe
 from utils.formatters import format_money, format_payment_reminder
 
@@ -231,12 +231,7 @@ async def cb_renew_payment(callback: CallbackQuery):
     new_due = (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d")
     new_due_display = (datetime.now() + timedelta(days=days)).strftime("%d.%m.%Y")
 
-    await db.update_payment_notified(payment_id, "")  # Reset notifications
-    await db._conn.execute(
-        "UPDATE payments SET due_date = ?, is_paid = 0, notified_days = '' WHERE id = ?",
-        (new_due, payment_id)
-    )
-    await db._conn.commit()
+    await db.update_payment_due(payment_id, new_due, reopen=True)
 
     text = (
         f"\u2705 <b>\u041e\u043f\u043b\u0430\u0447\u0435\u043d\u043e \u0438 \u043f\u0440\u043e\u0434\u043b\u0435\u043d\u043e!</b>\n"
@@ -311,11 +306,7 @@ async def fsm_edit_date(message: Message, state: FSMContext):
             await _delete_msg(message)
             return
 
-    await db._conn.execute(
-        "UPDATE payments SET due_date = ?, notified_days = '' WHERE id = ?",
-        (new_due, payment_id)
-    )
-    await db._conn.commit()
+    await db.update_payment_due(payment_id, new_due)
 
     today = datetime.now().date()
     due = datetime.strptime(new_due, "%Y-%m-%d").date()
@@ -534,14 +525,17 @@ async def _save_payment(callback: CallbackQuery, state: FSMContext, due_date: st
 
 # === History ===
 
-@router.callback_query(F.data == "pay:history")
+@router.callback_query(F.data.startswith("pay:history"))
 async def cb_payment_history(callback: CallbackQuery):
     if not await db.is_admin(callback.from_user.id):
         await _safe_callback_answer(callback, "\u26d4", show_alert=True)
         return
 
-    payments = await db.get_payments(active_only=False)
-    if not payments:
+    # pay:history[:p|n:due_date:id]
+    parts = callback.data.split(":")
+    cursor = (parts[3], int(parts[4])) if len(parts) == 5 else None
+    page = await db.get_payments_page(cursor, backward=len(parts) == 5 and parts[2] == "p")
+    if not page.rows:
         await callback.message.edit_text(
             "\U0001f4dc <b>\u0418\u0441\u0442\u043e\u0440\u0438\u044f \u043f\u043b\u0430\u0442\u0435\u0436\u0435\u0439</b>\n\n\u041f\u0443\u0441\u0442\u043e.",
             reply_markup=back_kb("menu:payments"),
@@ -551,11 +545,11 @@ async def cb_payment_history(callback: CallbackQuery):
         return
 
     text = "\U0001f4dc <b>\u0418\u0441\u0442\u043e\u0440\u0438\u044f \u043f\u043b\u0430\u0442\u0435\u0436\u0435\u0439</b>\n\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n\n"
-    for p in payments[:15]:
+    for p in page.rows:
         status = "\u2705" if p["is_paid"] else "\u23f3"
         text += f"{status} {p['description']} \u2014 {format_money(p['amount'])} ({p['due_date']})\n"
 
     await callback.message.edit_text(
-        text, reply_markup=back_kb("menu:payments"), parse_mode="HTML"
+        text, reply_markup=pager_kb("pay:history", page, "menu:payments"), parse_mode="HTML"
     )
     await _safe_callback_answer(callback)
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
@@ -9,10 +10,12 @@ from keyboards.inline import (
     vps_panel_kb, vps_panel_topic_kb, server_actions_kb, remnawave_kb, confirm_kb, back_kb
 )
 from services.ssh_manager import ssh_manager
-from utils.telegram_safe import edit_message_text_safe
+from services.status_cache import status_cache
+from utils.telegram_safe import edit_message_text_safe, message_revision
 from utils.formatters import format_server_list, format_money
 
 router = Router()
+_background_tasks: set[asyncio.Task] = set()
 
 
 async def _delete_msg(message: Message):
@@ -157,44 +160,38 @@ async def cb_server_list(callback: CallbackQuery):
 
 # === Select Server ===
 
-@router.callback_query(F.data.startswith("srv:select:"))
-async def cb_server_select(callback: CallbackQuery):
-    if not await db.is_admin(callback.from_user.id):
-        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
-        return
-    server_id = int(callback.data.split(":")[2])
-    server = await db.get_server(server_id)
-    if not server:
-        await _safe_callback_answer(callback, "\u0421\u0435\u0440\u0432\u0435\u0440 \u043d\u0435 \u043d\u0430\u0439\u0434\u0435\u043d", show_alert=True)
-        return
-
-    online = await ssh_manager.check_connection(dict(server))
-    status = "\U0001f7e2 Online" if online else "\U0001f534 Offline"
+async def _server_card_text(server, online: bool | None, age: float | None) -> str:
+    if online is None:
+        status = "\u23f3 \u041f\u0440\u043e\u0432\u0435\u0440\u043a\u0430..."
+    else:
+        status = "\U0001f7e2 Online" if online else "\U0001f534 Offline"
+        if not status_cache.is_fresh(age):
+            status += f" ({int(age // 60)} \u043c\u0438\u043d \u043d\u0430\u0437\u0430\u0434)"
+    server_id = server["id"]
 
     # Get payment info for this server
-    payments = await db.get_payments(active_only=True)
+    payments = await db.get_server_payments(server_id)
     today = datetime.now().date()
     payment_info = ""
     for p in payments:
-        if p["server_id"] == server_id:
-            due = datetime.strptime(p["due_date"], "%Y-%m-%d").date()
-            days_left = (due - today).days
-            if days_left < 0:
-                pay_icon = "\U0001f534"
-                pay_str = f"\u043f\u0440\u043e\u0441\u0440\u043e\u0447\u0435\u043d\u043e {abs(days_left)}\u0434"
-            elif days_left <= 3:
-                pay_icon = "\U0001f7e1"
-                pay_str = f"{days_left}\u0434 \u043e\u0441\u0442\u0430\u043b\u043e\u0441\u044c"
-            else:
-                pay_icon = "\U0001f7e2"
-                pay_str = f"{days_left}\u0434 \u043e\u0441\u0442\u0430\u043b\u043e\u0441\u044c"
-            payment_info += f"\n{pay_icon} \u041e\u043f\u043b\u0430\u0442\u0430: <b>{pay_str}</b> \u2022 {format_money(p['amount'])}"
-            payment_info += f"\n\U0001f4c5 \u0414\u043e: {p['due_date']}"
+        due = datetime.strptime(p["due_date"], "%Y-%m-%d").date()
+        days_left = (due - today).days
+        if days_left < 0:
+            pay_icon = "\U0001f534"
+            pay_str = f"\u043f\u0440\u043e\u0441\u0440\u043e\u0447\u0435\u043d\u043e {abs(days_left)}\u0434"
+        elif days_left <= 3:
+            pay_icon = "\U0001f7e1"
+            pay_str = f"{days_left}\u0434 \u043e\u0441\u0442\u0430\u043b\u043e\u0441\u044c"
+        else:
+            pay_icon = "\U0001f7e2"
+            pay_str = f"{days_left}\u0434 \u043e\u0441\u0442\u0430\u043b\u043e\u0441\u044c"
+        payment_info += f"\n{pay_icon} \u041e\u043f\u043b\u0430\u0442\u0430: <b>{pay_str}</b> \u2022 {format_money(p['amount'])}"
+        payment_info += f"\n\U0001f4c5 \u0414\u043e: {p['due_date']}"
 
     if not payment_info:
         payment_info = "\n\u26aa \u041e\u043f\u043b\u0430\u0442\u0430: <i>\u043d\u0435 \u043f\u0440\u0438\u0432\u044f\u0437\u0430\u043d\u0430</i>"
 
-    text = (
+    return (
         f"\U0001f5a5 <b>{server['name']}</b>\n"
         f"\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n"
         f"\U0001f310 Host: <code>{server['host']}:{server['port']}</code>\n"
@@ -203,9 +200,48 @@ async def cb_server_select(callback: CallbackQuery):
         f"\U0001f4e1 \u0421\u0442\u0430\u0442\u0443\u0441: <b>{status}</b>"
         f"{payment_info}"
     )
+
+
+async def _revalidate_server_card(message: Message, server: dict, revision: int):
+    online = await status_cache.refresh(server)
+    if message_revision(message.chat.id, message.message_id) != revision:
+        # The user has moved on to another screen
+        return
+    try:
+        await message.edit_text(
+            await _server_card_text(server, online, 0),
+            reply_markup=server_actions_kb(server["id"]),
+            parse_mode="HTML",
+        )
+    except Exception:
+        pass
+
+
+@router.callback_query(F.data.startswith("srv:select:"))
+async def cb_server_select(callback: CallbackQuery):
+    if not await db.is_admin(callback.from_user.id):
+        await _safe_callback_answer(callback, "\u26d4", show_alert=True)
+        return
+    server_id = int(callback.data.split(":")[2])
+    server = await db.get_server(server_id)
+    if not server:
+        await _safe_callback_answer(callback, "\u0421\u0435\u0440\u0432\u0435\u0440 \u043d\u0435 \u043d\u0430\u0439\u0434\u0435\u043d", show_alert=True)
+        return
+
+    online, age = status_cache.get(server_id)
     await callback.message.edit_text(
-        text, reply_markup=server_actions_kb(server_id), parse_mode="HTML"
+        await _server_card_text(server, online, age),
+        reply_markup=server_actions_kb(server_id),
+        parse_mode="HTML",
     )
+    if not status_cache.is_fresh(age):
+        # Stale or unknown: show what we have now, check over SSH in the background
+        message = callback.message
+        task = asyncio.create_task(_revalidate_server_card(
+            message, dict(server), message_revision(message.chat.id, message.message_id)
+        ))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
     await _safe_callback_answer(callback)
 
 
@@ -292,7 +328,7 @@ async def fsm_server_key(message: Message, state: FSMContext):
 
 async def _save_server(message: Message, state: FSMContext):
     data = await state.get_data()
-    await db.add_server(
+    server_id = await db.add_server(
         name=data["name"],
         host=data["host"],
         port=data.get("port", 22),
@@ -302,16 +338,10 @@ async def _save_server(message: Message, state: FSMContext):
         ssh_key=data.get("ssh_key"),
     )
 
-    # Test connection
-    server_dict = {
-        "host": data["host"],
-        "port": data.get("port", 22),
-        "username": data.get("username", "root"),
-        "auth_type": data.get("auth_type", "password"),
-        "password": data.get("password"),
-        "ssh_key": data.get("ssh_key"),
-    }
-    online = await ssh_manager.check_connection(server_dict)
+    # Test connection through the status cache, so the pooled connection and
+    # the cached status are keyed by the new server id
+    server = await db.get_server(server_id)
+    online = await status_cache.refresh(dict(server))
     status = "\U0001f7e2 \u041f\u043e\u0434\u043a\u043b\u044e\u0447\u0435\u043d\u0438\u0435 \u0443\u0441\u043f\u0435\u0448\u043d\u043e!" if online else "\U0001f534 \u041d\u0435 \u0443\u0434\u0430\u043b\u043e\u0441\u044c \u043f\u043e\u0434\u043a\u043b\u044e\u0447\u0438\u0442\u044c\u0441\u044f"
 
     await _edit_bot_msg(message, state,
@@ -405,6 +435,9 @@ async def fsm_edit_server_value(message: Message, state: FSMContext):
         value = int(value)
 
     await db.update_server(server_id, **{field: value})
+    # Pooled connections and the cached status belong to the old settings
+    ssh_manager.drop(server_id)
+    status_cache.forget(server_id)
     await _edit_bot_msg(message, state,
         f"\u2705 \u041f\u043e\u043b\u0435 \u0443\u0441\u043f\u0435\u0448\u043d\u043e \u043e\u0431\u043d\u043e\u0432\u043b\u0435\u043d\u043e!",
         reply_markup=back_kb(f"srv:edit:{server_id}"),
@@ -437,6 +470,8 @@ async def cb_delete_server(callback: CallbackQuery):
 async def cb_confirm_delete_server(callback: CallbackQuery):
     server_id = int(callback.data.split(":")[2])
     await db.delete_server(server_id)
+    ssh_manager.drop(server_id)
+    status_cache.forget(server_id)
     await callback.message.edit_text(
         "\u2705 \u0421\u0435\u0440\u0432\u0435\u0440 \u0443\u0434\u0430\u043b\u0451\u043d.",
         reply_markup=back_kb("vps:list"),
@@ -699,6 +734,8 @@ async def fsm_change_password(message: Message, state: FSMContext):
 
     if success:
         await db.update_server(server_id, password=new_pwd)
+        ssh_manager.drop(server_id)
+        status_cache.forget(server_id)
         await _edit_bot_msg(message, state,
             f"\u2705 \u041f\u0430\u0440\u043e\u043b\u044c \u0443\u0441\u043f\u0435\u0448\u043d\u043e \u0438\u0437\u043c\u0435\u043d\u0451\u043d!",
             reply_markup=back_kb("vps:ssh_manager"),
@@ -152,7 +152,8 @@ def monitoring_topic_kb(servers: list) -> InlineKeyboardMarkup:
 
 def monitoring_server_kb(server_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="\U0001f504 \u041e\u0431\u043d\u043e\u0432\u0438\u0442\u044c", callback_data=f"mon:refresh:{server_id}")],
+        [InlineKeyboardButton(text="\U0001f504 \u041e\u0431\u043d\u043e\u0432\u0438\u0442\u044c", callback_data=f"mon:refresh:{server_id}"),
+         InlineKeyboardButton(text="\U0001f4c8 \u0418\u0441\u0442\u043e\u0440\u0438\u044f", callback_data=f"mon:history:{server_id}")],
         [InlineKeyboardButton(text="\u25c0\ufe0f \u041d\u0430\u0437\u0430\u0434", callback_data="menu:monitoring")],
     ])
 
@@ -166,6 +167,8 @@ def admin_kb() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="\U0001f514 \u0423\u0432\u0435\u0434\u043e\u043c\u043b\u0435\u043d\u0438\u044f", callback_data="adm:notifications")],
         [InlineKeyboardButton(text="\U0001f4cb \u041b\u043e\u0433\u0438 \u0434\u0435\u0439\u0441\u0442\u0432\u0438\u0439", callback_data="adm:logs")],
         [InlineKeyboardButton(text="\U0001f4e4 \u042d\u043a\u0441\u043f\u043e\u0440\u0442 \u0434\u0430\u043d\u043d\u044b\u0445", callback_data="adm:export")],
+        [InlineKeyboardButton(text="\U0001f4be \u0411\u044d\u043a\u0430\u043f\u044b \u0411\u0414", callback_data="adm:backups")],
+        [InlineKeyboardButton(text="\U0001f4ca \u041e\u0447\u0435\u0440\u0435\u0434\u044c \u043e\u0442\u043f\u0440\u0430\u0432\u043a\u0438", callback_data="adm:stats")],
         [InlineKeyboardButton(text="\u25c0\ufe0f \u041d\u0430\u0437\u0430\u0434", callback_data="menu:back")],
     ])
 
@@ -177,6 +180,39 @@ def admin_topic_kb() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="\U0001f514 \u0423\u0432\u0435\u0434\u043e\u043c\u043b\u0435\u043d\u0438\u044f", callback_data="adm:notifications")],
         [InlineKeyboardButton(text="\U0001f4cb \u041b\u043e\u0433\u0438 \u0434\u0435\u0439\u0441\u0442\u0432\u0438\u0439", callback_data="adm:logs")],
         [InlineKeyboardButton(text="\U0001f4e4 \u042d\u043a\u0441\u043f\u043e\u0440\u0442 \u0434\u0430\u043d\u043d\u044b\u0445", callback_data="adm:export")],
+        [InlineKeyboardButton(text="\U0001f4be \u0411\u044d\u043a\u0430\u043f\u044b \u0411\u0414", callback_data="adm:backups")],
+        [InlineKeyboardButton(text="\U0001f4ca \u041e\u0447\u0435\u0440\u0435\u0434\u044c \u043e\u0442\u043f\u0440\u0430\u0432\u043a\u0438", callback_data="adm:stats")],
+    ])
+
+
+def export_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="CSV", callback_data="adm:export:csv"),
+         InlineKeyboardButton(text="JSON", callback_data="adm:export:json"),
+         InlineKeyboardButton(text="SQLite", callback_data="adm:export:sqlite")],
+        [InlineKeyboardButton(text="\u25c0\ufe0f \u041d\u0430\u0437\u0430\u0434", callback_data="menu:admin")],
+    ])
+
+
+def outbound_stats_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="\U0001f504 \u041e\u0431\u043d\u043e\u0432\u0438\u0442\u044c", callback_data="adm:stats")],
+        [InlineKeyboardButton(text="\u25c0\ufe0f \u041d\u0430\u0437\u0430\u0434", callback_data="menu:admin")],
+    ])
+
+
+def db_backups_kb(names: list[str]) -> InlineKeyboardMarkup:
+    buttons = [[InlineKeyboardButton(text="\U0001f4be \u0421\u043e\u0437\u0434\u0430\u0442\u044c \u0431\u044d\u043a\u0430\u043f", callback_data="adm:backups:run")]]
+    for name in names:
+        buttons.append([InlineKeyboardButton(text=f"\u267b\ufe0f {name}", callback_data=f"adm:restore:{name}")])
+    buttons.append([InlineKeyboardButton(text="\u25c0\ufe0f \u041d\u0430\u0437\u0430\u0434", callback_data="menu:admin")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def db_restore_confirm_kb(name: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="\u2705 \u0412\u043e\u0441\u0441\u0442\u0430\u043d\u043e\u0432\u0438\u0442\u044c", callback_data=f"adm:restore_ok:{name}"),
+         InlineKeyboardButton(text="\u274c \u041e\u0442\u043c\u0435\u043d\u0430", callback_data="adm:backups")],
     ])
 
 
@@ -212,3 +248,17 @@ def back_kb(callback: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="\u25c0\ufe0f \u041d\u0430\u0437\u0430\u0434", callback_data=callback)],
     ])
+
+
+def pager_kb(prefix: str, page, back: str) -> InlineKeyboardMarkup:
+    """Prev/next buttons carrying the keyset cursor as ``{prefix}:p|n:{key...}``."""
+    nav = []
+    if page.has_prev:
+        cursor = ":".join(str(k) for k in page.first_key)
+        nav.append(InlineKeyboardButton(text="\u2b05\ufe0f", callback_data=f"{prefix}:p:{cursor}"))
+    if page.has_next:
+        cursor = ":".join(str(k) for k in page.last_key)
+        nav.append(InlineKeyboardButton(text="\u27a1\ufe0f", callback_data=f"{prefix}:n:{cursor}"))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton(text="\u25c0\ufe0f \u041d\u0430\u0437\u0430\u0434", callback_data=back)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -0,0 +1 @@
+from middlewares.acl import AdminAccessMiddleware
@@ -0,0 +1,32 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from database import db
+
+
+class AdminAccessMiddleware(BaseMiddleware):
+    """Resolve admin rights once per update from the in-memory ACL.
+
+    Handlers receive an ``is_admin`` flag. Callback queries from non-admins
+    never reach a handler: every button in the bot is admin-only.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        is_admin = bool(user) and await db.is_admin(user.id)
+        data["is_admin"] = is_admin
+
+        if not is_admin and isinstance(event, CallbackQuery):
+            try:
+                await event.answer("\u26d4", show_alert=True)
+            except Exception:
+                pass
+            return None
+        return await handler(event, data)
@@ -0,0 +1,104 @@
+"""Benchmark the one-shot metrics parser against the legacy ``===`` parser.
+
+Each fixture exists in both formats and describes the same host:
+
+    metrics_host.*   recorded from a single-core VM with the two scripts
+    metrics_large.*  synthetic large host (128 cores, 400 interfaces) with
+                     identical counters in both files
+
+Run from the repository root:
+
+    python scripts/bench_metrics_parser.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.metrics_wire import parse_metrics  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def legacy_parse(output: str) -> dict:
+    """SSHManager._parse_metrics as it was before the v1 wire format."""
+    metrics = {}
+    sections = output.split("===")
+
+    for i, section in enumerate(sections):
+        section = section.strip()
+        if not section:
+            continue
+
+        if section == "CPU":
+            lines = sections[i + 1].strip().split("\n")
+            if len(lines) >= 2:
+                load = lines[0].split()
+                metrics["load_1m"] = float(load[0])
+                metrics["cpu_cores"] = int(lines[1].strip())
+
+        elif section == "MEM":
+            parts = sections[i + 1].strip().split()
+            if len(parts) >= 3:
+                metrics["ram_total"] = int(parts[1])
+                metrics["ram_used"] = int(parts[2])
+
+        elif section == "DISK":
+            parts = sections[i + 1].strip().split()
+            if len(parts) >= 4:
+                metrics["disk_total"] = int(parts[1])
+                metrics["disk_used"] = int(parts[2])
+
+        elif section == "NET":
+            counters = {}
+            for line in sections[i + 1].strip().split("\n"):
+                iface, sep, rest = line.partition(":")
+                iface = iface.strip()
+                fields = rest.split()
+                if sep and iface != "lo" and len(fields) >= 9:
+                    counters[iface] = (int(fields[0]), int(fields[8]))
+            metrics["net_counters"] = counters
+
+        elif section == "UPTIME":
+            metrics["uptime"] = int(float(sections[i + 1].strip().split()[0]))
+
+        elif section == "CPU_STAT":
+            counters = {}
+            for line in sections[i + 1].strip().split("\n"):
+                fields = line.split()
+                if len(fields) >= 5 and fields[0].startswith("cpu"):
+                    jiffies = [int(x) for x in fields[1:9]]
+                    counters[fields[0]] = tuple(jiffies + [0] * (8 - len(jiffies)))
+            metrics["cpu_counters"] = counters
+
+    return metrics
+
+
+def per_call_us(func, arg: str) -> float:
+    number = max(1, 200_000 // max(len(arg), 1))
+    return min(timeit.repeat(lambda: func(arg), number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    for name in ("metrics_host", "metrics_large"):
+        legacy_out = (FIXTURES / f"{name}.legacy.txt").read_text()
+        v1_out = (FIXTURES / f"{name}.v1.txt").read_text()
+
+        old = legacy_parse(legacy_out)
+        new, errors = parse_metrics(v1_out)
+        if errors:
+            sys.exit(f"{name}: parse errors {errors}")
+        # The host recordings were taken a moment apart, so compare what they cover
+        for field in ("cpu_counters", "net_counters"):
+            if old[field].keys() != new[field].keys():
+                sys.exit(f"{name}: {field} differs between parsers")
+
+        print(
+            f"{name:14} legacy {per_call_us(legacy_parse, legacy_out):8.1f} us ({len(legacy_out)} B)"
+            f"   v1 {per_call_us(parse_metrics, v1_out):8.1f} us ({len(v1_out)} B)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import hashlib
+import logging
+from datetime import datetime
+
+from aiogram.exceptions import TelegramBadRequest
+
+from database import db
+from services.monitoring_service import monitoring_service
+from services.status_cache import status_cache
+from utils.formatters import format_fleet_dashboard
+from utils.telegram_safe import Priority, edit_message_text_safe, outbound_priority, send_message_safe
+
+logger = logging.getLogger(__name__)
+
+
+class FleetDashboard:
+    """Pinned fleet overview in the monitoring topic, edited in place.
+
+    Rendered from the status cache and the last collected metrics, so an
+    update never talks to the servers. The edit is skipped while the
+    rendered text hashes the same, which caps the cost at one API call per
+    tick. The message id lives in the ``dashboard_message_id`` setting.
+    """
+
+    def __init__(self):
+        self._digest: bytes | None = None
+
+    async def render(self) -> str:
+        rows = []
+        for server in await db.get_servers():
+            online, _ = status_cache.get(server["id"])
+            rows.append((dict(server), online, monitoring_service.get_cached_metrics(server["id"])))
+        return format_fleet_dashboard(rows)
+
+    def reset(self):
+        """Post a new message on the next update (e.g. the topic changed)."""
+        self._digest = None
+
+    async def update(self, bot, chat_id: int, thread_id: int | None):
+        body = await self.render()
+        digest = hashlib.blake2b(body.encode(), digest_size=16).digest()
+        message_id = db.settings.get("dashboard_message_id")
+        if message_id and digest == self._digest:
+            return
+
+        text = body + f"\n\U0001f550 {datetime.now().strftime('%d.%m.%Y %H:%M')}"
+        with outbound_priority(Priority.BULK):
+            if message_id:
+                try:
+                    await edit_message_text_safe(
+                        bot, text=text, chat_id=chat_id, message_id=message_id, parse_mode="HTML"
+                    )
+                    self._digest = digest
+                    return
+                except TelegramBadRequest as e:
+                    # Deleted by someone: post a fresh one below
+                    logger.warning(f"Dashboard message {message_id} is gone: {e}")
+
+            msg = await send_message_safe(
+                bot, chat_id=chat_id, message_thread_id=thread_id, text=text, parse_mode="HTML"
+            )
+            try:
+                await bot.pin_chat_message(chat_id=chat_id, message_id=msg.message_id, disable_notification=True)
+            except Exception as e:
+                logger.warning(f"Cannot pin the dashboard (no pin rights?): {e}")
+        await db.set_setting("dashboard_message_id", msg.message_id)
+        self._digest = digest
+
+
+fleet_dashboard = FleetDashboard()
@@ -0,0 +1,150 @@
+"""Online backups of the SQLite database.
+
+Snapshots are taken with SQLite's backup API on a separate read-only
+connection in a worker thread, DB_BACKUP_PAGES pages per step. That
+connection holds one read transaction for the whole copy, so in WAL mode
+the snapshot is consistent and the bot keeps reading and writing meanwhile.
+"""
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from config import DB_BACKUP_DIR, DB_BACKUP_KEEP, DB_BACKUP_PAGES
+from database import db
+from database.fsm_storage import fsm_storage
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "sentinel-"
+BACKUP_SUFFIX = ".db.gz"
+
+# A restored file must at least contain the baseline schema
+_REQUIRED_TABLES = {"servers", "payments", "balance_history", "settings", "admins", "action_logs"}
+
+_backup_lock = asyncio.Lock()
+
+
+def _snapshot(src_path: str, dst_path: str):
+    src = sqlite3.connect(Path(src_path).resolve().as_uri() + "?mode=ro", uri=True)
+    dst = sqlite3.connect(dst_path)
+    try:
+        # Pin one WAL snapshot; commits by the bot do not restart the copy
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master")
+        src.backup(dst, pages=DB_BACKUP_PAGES, sleep=0.01)
+    finally:
+        src.close()
+        dst.close()
+
+
+def _check(path: str) -> str | None:
+    """Why ``path`` is not a usable database, or None when it is."""
+    try:
+        conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                return f"integrity_check: {result}"
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return str(e)
+    missing = _REQUIRED_TABLES - tables
+    if missing:
+        return f"missing tables: {', '.join(sorted(missing))}"
+    return None
+
+
+def _compress(src: str, dst: str):
+    with open(src, "rb") as f_in, gzip.open(dst, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+
+
+def _decompress(src: str, dst: str):
+    with gzip.open(src, "rb") as f_in, open(dst, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+
+
+def list_backups() -> list[Path]:
+    """Backup archives, newest first."""
+    directory = Path(DB_BACKUP_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob(f"{BACKUP_PREFIX}*{BACKUP_SUFFIX}"), reverse=True)
+
+
+def _rotate():
+    for path in list_backups()[max(DB_BACKUP_KEEP, 1):]:
+        path.unlink(missing_ok=True)
+        logger.info(f"Removed old backup {path.name}")
+
+
+def _build(db_path: str) -> Path:
+    directory = Path(DB_BACKUP_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Microseconds keep two backups in one second (e.g. the safety backup
+    # taken by a restore) apart while names still sort by time
+    archive = directory / f"{BACKUP_PREFIX}{datetime.now():%Y%m%d-%H%M%S-%f}{BACKUP_SUFFIX}"
+    if archive.exists():
+        raise FileExistsError(f"backup {archive.name} already exists")
+    raw = str(archive.with_suffix(".tmp"))
+    try:
+        _snapshot(db_path, raw)
+        error = _check(raw)
+        if error:
+            raise ValueError(f"snapshot is broken: {error}")
+        _compress(raw, str(archive) + ".part")
+        os.replace(str(archive) + ".part", archive)
+    finally:
+        for leftover in (raw, str(archive) + ".part"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    _rotate()
+    return archive
+
+
+async def create_backup() -> Path:
+    """Snapshot, verify and compress the database; keeps DB_BACKUP_KEEP archives."""
+    async with _backup_lock:
+        # Queued write-behind rows belong in the snapshot too
+        await db.flush()
+        archive = await asyncio.to_thread(_build, db.db_path)
+    logger.info(f"Database backup written to {archive} ({archive.stat().st_size} bytes)")
+    return archive
+
+
+async def restore_backup(name: str):
+    """Replace the live database with the archive ``name`` from list_backups().
+
+    The archive is unpacked next to the database and checked before anything
+    is touched; the current database is backed up first. FSM states are
+    reloaded from the restored file. Raises ValueError when the archive is
+    unknown or fails the check.
+    """
+    archive = next((path for path in list_backups() if path.name == name), None)
+    if archive is None:
+        raise ValueError(f"unknown backup {name!r}")
+
+    staged = db.db_path + ".restore"
+    try:
+        await asyncio.to_thread(_decompress, str(archive), staged)
+        error = await asyncio.to_thread(_check, staged)
+        if error:
+            raise ValueError(f"{name} is broken: {error}")
+        async with _backup_lock:
+            await db.flush()
+            safety = await asyncio.to_thread(_build, db.db_path)
+            logger.info(f"Database backed up to {safety.name} before restore")
+            await db.replace_file(staged)
+            # Dialog states in memory predate the restore; use the restored table
+            await fsm_storage.load()
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+    logger.warning(f"Database restored from {name}")
@@ -0,0 +1,159 @@
+"""Full data export to a compressed file.
+
+Tables are streamed from the database in keyset chunks and each chunk is
+written out (in a worker thread) before the next one is fetched, so memory
+use does not depend on the size of the dataset.
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import zipfile
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_ROWS = 500
+
+# name -> (query, keyset key); server credentials never leave the database
+EXPORT_TABLES: dict[str, tuple[str, tuple[str, ...]]] = {
+    "servers": (
+        "SELECT id, name, host, port, username, auth_type, is_active, created_at FROM servers",
+        ("id",),
+    ),
+    "payments": ("SELECT * FROM payments", ("id",)),
+    "balance_history": ("SELECT * FROM balance_history", ("id",)),
+    "action_logs": ("SELECT * FROM action_logs", ("id",)),
+    "metrics_1m": ("SELECT * FROM metrics_1m", ("server_id", "ts")),
+    "metrics_1h": ("SELECT * FROM metrics_1h", ("server_id", "ts")),
+    "metrics_1d": ("SELECT * FROM metrics_1d", ("server_id", "ts")),
+}
+
+
+class _CsvWriter:
+    """ZIP archive with one deflated CSV file per table."""
+
+    suffix = ".csv.zip"
+
+    def __init__(self, path: str):
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._file = None
+        self._csv = None
+
+    def begin(self, table: str, columns: list[str]):
+        self._file = io.TextIOWrapper(
+            self._zip.open(f"{table}.csv", "w", force_zip64=True), encoding="utf-8", newline=""
+        )
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(columns)
+
+    def write(self, rows):
+        self._csv.writerows(rows)
+
+    def end(self):
+        self._file.close()
+
+    def close(self):
+        self._zip.close()
+
+
+class _JsonWriter:
+    """Gzipped JSON object mapping each table to a list of row objects."""
+
+    suffix = ".json.gz"
+
+    def __init__(self, path: str):
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._file.write("{")
+        self._tables = 0
+        self._columns: list[str] = []
+        self._rows = 0
+
+    def begin(self, table: str, columns: list[str]):
+        self._file.write(("," if self._tables else "") + f"\n{json.dumps(table)}: [")
+        self._tables += 1
+        self._columns = columns
+        self._rows = 0
+
+    def write(self, rows):
+        for row in rows:
+            self._file.write(("," if self._rows else "") + "\n  ")
+            self._file.write(json.dumps(dict(zip(self._columns, row)), ensure_ascii=False))
+            self._rows += 1
+
+    def end(self):
+        self._file.write("\n]")
+
+    def close(self):
+        self._file.write("\n}\n")
+        self._file.close()
+
+
+class _SqliteWriter:
+    """Standalone SQLite database, gzipped once all tables are written."""
+
+    suffix = ".sqlite.gz"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._tmp = path + ".tmp"
+        # Calls come from to_thread workers, one at a time
+        self._conn = sqlite3.connect(self._tmp, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = OFF")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._insert = ""
+
+    def begin(self, table: str, columns: list[str]):
+        quoted = ", ".join(f'"{col}"' for col in columns)
+        self._conn.execute(f'CREATE TABLE "{table}" ({quoted})')
+        self._insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" * len(columns))})'
+
+    def write(self, rows):
+        self._conn.executemany(self._insert, rows)
+
+    def end(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+        try:
+            with open(self._tmp, "rb") as src, gzip.open(self._path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        finally:
+            os.remove(self._tmp)
+
+
+EXPORT_FORMATS = {"csv": _CsvWriter, "json": _JsonWriter, "sqlite": _SqliteWriter}
+
+
+def export_suffix(fmt: str) -> str:
+    return EXPORT_FORMATS[fmt].suffix
+
+
+async def export_counts() -> dict[str, int]:
+    return await db.count_rows(EXPORT_TABLES)
+
+
+async def export_data(fmt: str, path: str) -> dict[str, int]:
+    """Write every export table to ``path`` in ``fmt``; returns rows written per table."""
+    writer = await asyncio.to_thread(EXPORT_FORMATS[fmt], path)
+    written: dict[str, int] = {}
+    try:
+        for table, (query, key) in EXPORT_TABLES.items():
+            columns = await db.get_columns(query)
+            await asyncio.to_thread(writer.begin, table, columns)
+            written[table] = 0
+            async for rows in db.iter_rows(query, key, EXPORT_CHUNK_ROWS):
+                await asyncio.to_thread(writer.write, [tuple(row) for row in rows])
+                written[table] += len(rows)
+            await asyncio.to_thread(writer.end)
+    finally:
+        await asyncio.to_thread(writer.close)
+    logger.info(f"Exported {sum(written.values())} rows as {fmt} to {path}")
+    return written
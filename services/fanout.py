@@ -0,0 +1,97 @@
+import asyncio
+import ipaddress
+import logging
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+def provider_key(host: str) -> str:
+    """Group servers that most likely share a hosting provider.
+
+    There is no provider column, so IPv4 hosts are grouped by /24, IPv6 by /48
+    and hostnames by their last two labels.
+    """
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return ".".join(host.lower().rstrip(".").split(".")[-2:])
+    prefix = 24 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+async def fan_out(
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    *,
+    limit: int,
+    group_key: Callable[[Any], Hashable] | None = None,
+    group_limit: int = 0,
+    timeout: float | None = None,
+    deadline: float | None = None,
+    unfinished: Any = None,
+) -> AsyncIterator[tuple[Any, Any]]:
+    """Run worker over items with bounded concurrency, yielding (item, result) as each finishes.
+
+    A worker that fails yields None. A worker that exceeds ``timeout``, or is
+    cancelled once ``deadline`` seconds have passed (possibly before it ever
+    started), yields ``unfinished`` so callers can tell it from a real result.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    global_sem = asyncio.Semaphore(max(limit, 1))
+    group_sems: dict[Hashable, asyncio.Semaphore] = defaultdict(
+        lambda: asyncio.Semaphore(group_limit)
+    )
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def _run(index: int, item):
+        result = None
+        try:
+            if group_key and group_limit > 0:
+                # Group slot first so a saturated provider does not hold global slots
+                async with group_sems[group_key(item)]:
+                    async with global_sem:
+                        result = await asyncio.wait_for(worker(item), timeout)
+            else:
+                async with global_sem:
+                    result = await asyncio.wait_for(worker(item), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Fan-out worker timed out after {timeout}s: {item!r:.80}")
+            result = unfinished
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Fan-out worker failed: {e}")
+        done.put_nowait((index, result))
+
+    tasks = {i: asyncio.create_task(_run(i, item)) for i, item in enumerate(items)}
+    started = time.monotonic()
+    try:
+        while tasks:
+            remaining = None if deadline is None else deadline - (time.monotonic() - started)
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                index, result = await asyncio.wait_for(done.get(), remaining)
+            except asyncio.TimeoutError:
+                while not done.empty():
+                    index, result = done.get_nowait()
+                    tasks.pop(index, None)
+                    yield items[index], result
+                if not tasks:
+                    return
+                logger.warning(f"Fan-out deadline {deadline}s reached, cancelling {len(tasks)} stragglers")
+                for index in list(tasks):
+                    tasks.pop(index).cancel()
+                    yield items[index], unfinished
+                return
+            tasks.pop(index, None)
+            yield items[index], result
+    finally:
+        for task in tasks.values():
+            task.cancel()
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from config import LATENCY_CONCURRENCY, LATENCY_TIMEOUT, LATENCY_WINDOW
+from database import db
+from services.fanout import fan_out
+from services.status_cache import status_cache
+from utils.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyProber:
+    """TCP connect round-trip time from the bot host to each server's SSH port.
+
+    Probes run on their own schedule and keep a rolling window per server, so
+    metrics polls only read the summary and never pay for a probe.
+    """
+
+    def __init__(self):
+        # server_id -> recent RTTs in ms, None for a failed probe
+        self._samples: dict[int, deque] = {}
+
+    async def probe(self, host: str, port: int) -> float | None:
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), LATENCY_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        rtt = (time.perf_counter() - started) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return rtt
+
+    async def probe_all(self):
+        servers = [dict(s) for s in await db.get_servers()]
+
+        async def _probe(server):
+            return await self.probe(server["host"], server["port"])
+
+        async for server, rtt in fan_out(servers, _probe, limit=LATENCY_CONCURRENCY):
+            self.record(server["id"], rtt)
+            status_cache.set_reachable(server["id"], rtt is not None)
+
+        known = {s["id"] for s in servers}
+        for server_id in [sid for sid in self._samples if sid not in known]:
+            self.forget(server_id)
+
+    def record(self, server_id: int, rtt: float | None):
+        self._samples.setdefault(server_id, deque(maxlen=LATENCY_WINDOW)).append(rtt)
+
+    def forget(self, server_id: int):
+        self._samples.pop(server_id, None)
+
+    def summary(self, server_id: int) -> dict:
+        """Latest RTT plus min / avg / p95 / jitter and loss over the window, in ms and %."""
+        samples = self._samples.get(server_id)
+        if not samples:
+            return {}
+        ok = [s for s in samples if s is not None]
+        result = {"ping_loss": (len(samples) - len(ok)) / len(samples) * 100}
+        if not ok:
+            return result
+        # Jitter as the mean difference between consecutive successful probes
+        diffs = [abs(b - a) for a, b in zip(ok, ok[1:])]
+        result.update({
+            "ping_ms": round(ok[-1], 1),
+            "ping_min": min(ok),
+            "ping_avg": sum(ok) / len(ok),
+            "ping_p95": percentile(ok, 95),
+            "ping_jitter": sum(diffs) / len(diffs) if diffs else 0,
+        })
+        return result
+
+
+latency_prober = LatencyProber()
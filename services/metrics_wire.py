@@ -0,0 +1,107 @@
+"""Wire format of the one-shot metrics script.
+
+The script prints one ``key=value`` pair per line, starting with ``v=N``.
+Repeated keys (``cpu``, ``net``) carry one CPU or interface each. Values never
+need escaping because the parser only splits a line on its first ``=``, and
+unknown keys are skipped so newer scripts stay readable by older parsers.
+"""
+
+WIRE_VERSION = 1
+
+METRICS_SCRIPT = r"""
+echo v=%(version)d
+read -r l _ < /proc/loadavg && echo "load=$l"
+awk '$1 == "MemTotal:" {t = $2} $1 == "MemAvailable:" {a = $2} END {print "mem=" t " " a}' /proc/meminfo
+df -P -B1 / | awk 'NR == 2 {print "disk=" $2 " " $3}'
+read -r u _ < /proc/uptime && echo "up=$u"
+sed -n 's/^cpu/cpu=cpu/p' /proc/stat
+sed -n '3,$s/^ *\([^:]*\): */net=\1 /p' /proc/net/dev
+""" % {"version": WIRE_VERSION}
+
+REQUIRED_FIELDS = ("load", "mem", "disk", "up", "cpu")
+
+
+def _parse_load(value: str, metrics: dict):
+    metrics["load_1m"] = float(value)
+
+
+def _parse_mem(value: str, metrics: dict):
+    total, avail = (int(x) * 1024 for x in value.split())
+    metrics["ram_total"] = total
+    metrics["ram_used"] = total - avail
+    metrics["ram_percent"] = (metrics["ram_used"] / total * 100) if total else 0
+
+
+def _parse_disk(value: str, metrics: dict):
+    total, used = (int(x) for x in value.split())
+    metrics["disk_total"] = total
+    metrics["disk_used"] = used
+    metrics["disk_percent"] = (used / total * 100) if total else 0
+
+
+def _parse_uptime(value: str, metrics: dict):
+    metrics["uptime"] = int(float(value))
+
+
+def _parse_cpu(value: str, metrics: dict):
+    # name user nice system idle iowait irq softirq steal ...
+    fields = value.split(None, 9)
+    if len(fields) < 5 or not fields[0].startswith("cpu"):
+        raise ValueError(f"bad /proc/stat line {value[:40]!r}")
+    jiffies = [int(x) for x in fields[1:9]]
+    counters = metrics.setdefault("cpu_counters", {})
+    counters[fields[0]] = tuple(jiffies + [0] * (8 - len(jiffies)))
+    if fields[0] != "cpu":
+        metrics["cpu_cores"] = metrics.get("cpu_cores", 0) + 1
+
+
+def _parse_net(value: str, metrics: dict):
+    # iface rx_bytes rx_packets ... (8 rx fields) tx_bytes ...
+    fields = value.split(None, 10)
+    counters = metrics.setdefault("net_counters", {})
+    if fields[0] != "lo":
+        counters[fields[0]] = (int(fields[1]), int(fields[9]))
+
+
+_FIELDS = {
+    "load": _parse_load,
+    "mem": _parse_mem,
+    "disk": _parse_disk,
+    "up": _parse_uptime,
+    "cpu": _parse_cpu,
+    "net": _parse_net,
+}
+
+
+def parse_metrics(output: str) -> tuple[dict | None, list[str]]:
+    """Parse script output in one pass over its lines.
+
+    Returns the metrics and a list of per-field errors. A broken field is
+    reported and left out; metrics are None only when the output is not in
+    this wire format at all.
+    """
+    metrics: dict = {}
+    errors: list[str] = []
+    seen: set[str] = set()
+    version = None
+
+    for line in output.splitlines():
+        key, sep, value = line.partition("=")
+        if not sep:
+            continue
+        if key == "v":
+            version = value.strip()
+            continue
+        parser = _FIELDS.get(key)
+        if parser is None:
+            continue
+        seen.add(key)
+        try:
+            parser(value, metrics)
+        except (ValueError, IndexError) as e:
+            errors.append(f"{key}: {e}")
+
+    if version != str(WIRE_VERSION):
+        return None, [f"v: expected {WIRE_VERSION}, got {version!r}"]
+    errors.extend(f"{key}: missing" for key in REQUIRED_FIELDS if key not in seen)
+    return metrics, errors
@@ -1,45 +1,67 @@
-import asyncio
 import logging
+import time
 from datetime import datetime
+from typing import AsyncIterator
 
+from services.fanout import fan_out, provider_key
+from services.latency_prober import latency_prober
 from services.ssh_manager import ssh_manager
+from services.status_cache import status_cache
 from database import db
-from config import ALERT_CPU_THRESHOLD, ALERT_RAM_THRESHOLD, ALERT_DISK_THRESHOLD
+from utils.stats import percentile
+from config import (
+    METRICS_RETENTION_DAYS,
+    ALERT_CPU_THRESHOLD, ALERT_RAM_THRESHOLD, ALERT_DISK_THRESHOLD,
+    ALERT_CRITICAL_THRESHOLD, ALERT_REPEAT_SECONDS,
+    MONITOR_CONCURRENCY, MONITOR_PROVIDER_CONCURRENCY, MONITOR_SERVER_TIMEOUT, MONITOR_TICK_DEADLINE,
+)
 
 logger = logging.getLogger(__name__)
 
+COUNTER_32_MAX = 2 ** 32
+# fan_out result for a poll that timed out or never ran before the tick deadline
+_UNFINISHED = object()
+
 
 class MonitoringService:
     def __init__(self):
         self._last_metrics: dict[int, dict] = {}
-        self._alerts_sent: dict[str, datetime] = {}
+        # "server_id:metric" -> (last delivery, suppressed repeats since then)
+        self._alerts_sent: dict[str, tuple[datetime, int]] = {}
+        # server_id -> (monotonic time, remote uptime, {iface: (rx, tx)}, (up_rate, down_rate))
+        self._net_state: dict[int, tuple] = {}
+        # server_id -> (remote uptime, {"cpu": jiffies, "cpu0": jiffies, ...}, last usage)
+        self._cpu_state: dict[int, tuple] = {}
 
     async def collect_all(self) -> dict[int, dict | None]:
-        servers = await db.get_servers()
         results = {}
-
-        tasks = []
-        for server in servers:
-            tasks.append(self._collect_one(dict(server), server["id"]))
-
-        collected = await asyncio.gather(*tasks, return_exceptions=True)
-        for server_id, metrics in collected:
-            if isinstance(metrics, Exception):
-                results[server_id] = None
-            else:
-                results[server_id] = metrics
-                if metrics:
-                    self._last_metrics[server_id] = metrics
-
+        async for server_id, metrics in self.iter_collect():
+            results[server_id] = metrics
         return results
 
-    async def _collect_one(self, server: dict, server_id: int) -> tuple[int, dict | None]:
-        try:
-            metrics = await ssh_manager.get_metrics(server)
-            return server_id, metrics
-        except Exception as e:
-            logger.error(f"Monitoring error for server {server_id}: {e}")
-            return server_id, None
+    async def iter_collect(self) -> AsyncIterator[tuple[int, dict | None]]:
+        """Yield (server_id, metrics) as each server answers; stragglers come last as None."""
+        servers = [dict(s) for s in await db.get_servers()]
+
+        async for server, metrics in fan_out(
+            servers,
+            ssh_manager.get_metrics,
+            limit=MONITOR_CONCURRENCY,
+            group_key=lambda s: provider_key(s["host"]),
+            group_limit=MONITOR_PROVIDER_CONCURRENCY,
+            timeout=MONITOR_SERVER_TIMEOUT,
+            deadline=MONITOR_TICK_DEADLINE,
+            unfinished=_UNFINISHED,
+        ):
+            if metrics is _UNFINISHED:
+                # Timed out or never polled before the deadline: says nothing
+                # about the server, so the cached status is left to go stale
+                yield server["id"], None
+                continue
+            if metrics:
+                self._enrich(server["id"], metrics)
+            status_cache.set(server["id"], metrics is not None)
+            yield server["id"], metrics
 
     async def collect_server(self, server_id: int) -> dict | None:
         server = await db.get_server(server_id)
@@ -47,13 +69,142 @@ class MonitoringService:
             return None
         metrics = await ssh_manager.get_metrics(dict(server))
         if metrics:
-            self._last_metrics[server_id] = metrics
+            self._enrich(server_id, metrics)
+        status_cache.set(server_id, metrics is not None)
         return metrics
 
+    def _enrich(self, server_id: int, metrics: dict):
+        """Derive rates from raw counters, merge the latest latency probes and cache the result."""
+        self._apply_cpu_usage(server_id, metrics)
+        self._apply_net_rates(server_id, metrics)
+        metrics.update(latency_prober.summary(server_id))
+        self._last_metrics[server_id] = metrics
+
+    def _apply_cpu_usage(self, server_id: int, metrics: dict):
+        """Turn raw /proc/stat jiffies into utilisation over the interval since the last poll.
+
+        The first poll after start or reboot has no baseline and reports the
+        average since boot instead.
+        """
+        counters = metrics.pop("cpu_counters", None)
+        if not counters or "cpu" not in counters:
+            cores = max(metrics.get("cpu_cores", 1), 1)
+            metrics["cpu_percent"] = min(metrics.get("load_1m", 0) / cores * 100, 100)
+            return
+        uptime = metrics.get("uptime", 0)
+        prev = self._cpu_state.get(server_id)
+        baseline = prev[1] if prev and uptime >= prev[0] else {}
+
+        usage = self._cpu_breakdown(baseline.get("cpu"), counters["cpu"])
+        if usage is None:
+            # No jiffies elapsed since the previous poll, keep its figures
+            usage = prev[2] if prev else (0.0, 0.0, 0.0)
+        per_core = []
+        cores = sorted((name for name in counters if name != "cpu"), key=lambda n: int(n[3:]))
+        for name in cores:
+            core = self._cpu_breakdown(baseline.get(name), counters[name])
+            per_core.append(core[0] if core else 0.0)
+
+        self._cpu_state[server_id] = (uptime, counters, usage)
+        metrics["cpu_percent"], metrics["cpu_iowait"], metrics["cpu_steal"] = usage
+        metrics["cpu_per_core"] = per_core
+
+    @staticmethod
+    def _cpu_breakdown(prev: tuple | None, cur: tuple) -> tuple[float, float, float] | None:
+        """(busy, iowait, steal) percentages; busy counts everything except idle and iowait."""
+        # Per-core counters can step back when a core goes offline, clamp at zero
+        delta = [max(c - p, 0) for c, p in zip(cur, prev or (0,) * len(cur))]
+        total = sum(delta)
+        if total <= 0:
+            return None
+        idle, iowait, steal = delta[3], delta[4], delta[7]
+        return (
+            (total - idle - iowait) / total * 100,
+            iowait / total * 100,
+            steal / total * 100,
+        )
+
+    def _apply_net_rates(self, server_id: int, metrics: dict):
+        """Turn raw /proc/net/dev counters into bytes/s summed over non-loopback interfaces."""
+        counters = metrics.pop("net_counters", None)
+        if counters is None:
+            return
+        now = time.monotonic()
+        uptime = metrics.get("uptime", 0)
+        prev = self._net_state.get(server_id)
+        rates = (0.0, 0.0)
+
+        if prev:
+            prev_time, prev_uptime, prev_counters, prev_rates = prev
+            elapsed = now - prev_time
+            if elapsed < 1:
+                # Polled twice in a row (refresh button), keep the last interval's rate
+                metrics["net_upload"], metrics["net_download"] = prev_rates
+                return
+            if uptime >= prev_uptime:
+                rx_total = tx_total = 0
+                for iface, (rx, tx) in counters.items():
+                    if iface not in prev_counters:
+                        continue
+                    prev_rx, prev_tx = prev_counters[iface]
+                    rx_total += self._counter_delta(prev_rx, rx)
+                    tx_total += self._counter_delta(prev_tx, tx)
+                rates = (tx_total / elapsed, rx_total / elapsed)
+            # else: the server rebooted and its counters restarted from zero
+
+        self._net_state[server_id] = (now, uptime, counters, rates)
+        metrics["net_upload"], metrics["net_download"] = rates
+
+    @staticmethod
+    def _counter_delta(prev: int, cur: int) -> int:
+        if cur >= prev:
+            return cur - prev
+        if prev < COUNTER_32_MAX:
+            # 32-bit counter wrapped
+            return cur + COUNTER_32_MAX - prev
+        # 64-bit counters do not wrap in practice; treat as a reset
+        return 0
+
     def get_cached_metrics(self, server_id: int) -> dict | None:
         return self._last_metrics.get(server_id)
 
-    def check_alerts(self, server_id: int, server_name: str, metrics: dict) -> list[str]:
+    async def store_tick(self, samples: dict[int, dict]):
+        await db.add_metrics_batch(int(time.time()), samples)
+
+    async def maintain_history(self):
+        now = int(time.time())
+        await db.rollup_metrics(now, METRICS_RETENTION_DAYS)
+        await db.prune_metrics(now, METRICS_RETENTION_DAYS)
+
+    async def get_history_summary(self, server_id: int, period: int) -> dict | None:
+        """Avg / p95 / max for CPU and RAM plus disk trend over the last `period` seconds."""
+        if period <= 2 * 86400:
+            resolution = "1m"
+        elif period <= 60 * 86400:
+            resolution = "1h"
+        else:
+            resolution = "1d"
+        rows = await db.get_metrics_history(server_id, int(time.time()) - period, resolution)
+        if not rows:
+            return None
+
+        summary = {"samples": sum(r["samples"] for r in rows)}
+        for field in ("cpu", "ram"):
+            values = [r[field] / 10 for r in rows]
+            summary[f"{field}_avg"] = sum(r[field] * r["samples"] for r in rows) / summary["samples"] / 10
+            summary[f"{field}_p95"] = percentile(values, 95)
+            summary[f"{field}_max"] = max(r[f"{field}_max"] for r in rows) / 10
+        summary["disk_first"] = rows[0]["disk"] / 10
+        summary["disk_last"] = rows[-1]["disk"] / 10
+        return summary
+
+    def check_alerts(self, server_id: int, server_name: str, metrics: dict) -> list[dict]:
+        """Active alerts of one server.
+
+        An alert repeats at most every ALERT_REPEAT_SECONDS; in between it is
+        returned with ``suppressed`` set, and ``repeats`` counts the suppressed
+        occurrences since it was last delivered.
+        """
         alerts = []
         now = datetime.now()
 
@@ -65,16 +216,21 @@ class MonitoringService:
 
         for key, value, threshold, label in checks:
             alert_key = f"{server_id}:{key}"
-            if value >= threshold:
-                last_sent = self._alerts_sent.get(alert_key)
-                if not last_sent or (now - last_sent).seconds > 600:
-                    alerts.append(
-                        f"\u26a0\ufe0f <b>\u0410\u043b\u0435\u0440\u0442: {server_name}</b>\n"
-                        f"{label}: <b>{value:.0f}%</b> (>\u2009{threshold}%)"
-                    )
-                    self._alerts_sent[alert_key] = now
-            else:
+            if value < threshold:
                 self._alerts_sent.pop(alert_key, None)
+                continue
+            last_sent, repeats = self._alerts_sent.get(alert_key, (None, 0))
+            suppressed = bool(last_sent) and (now - last_sent).total_seconds() <= ALERT_REPEAT_SECONDS
+            alerts.append({
+                "server": server_name,
+                "label": label,
+                "value": value,
+                "threshold": threshold,
+                "severity": "critical" if value >= ALERT_CRITICAL_THRESHOLD else "warning",
+                "suppressed": suppressed,
+                "repeats": repeats,
+            })
+            self._alerts_sent[alert_key] = (last_sent, repeats + 1) if suppressed else (now, 0)
 
         return alerts
 
@@ -1,14 +1,24 @@
-import asyncio
 import logging
 from datetime import datetime
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from config import MONITOR_INTERVAL, REMINDER_DAYS, GROUP_ID
+from aiogram.types import FSInputFile
+
+from config import (
+    MONITOR_INTERVAL, LATENCY_PROBE_INTERVAL, REMINDER_DAYS, GROUP_ID, TOPIC_IDS,
+    DB_BACKUP_INTERVAL_HOURS, DB_BACKUP_SEND, MONITOR_DASHBOARD_ENABLED,
+)
 from database import db
+from database.fsm_storage import fsm_storage
+from services.dashboard import fleet_dashboard
+from services.db_backup import create_backup
+from services.latency_prober import latency_prober
 from services.monitoring_service import monitoring_service
-from utils.formatters import format_payment_reminder
-from utils.telegram_safe import send_message_safe
+from utils.formatters import format_alert_digest, format_payment_reminder
+from utils.telegram_safe import (
+    MAX_DOCUMENT_BYTES, Priority, outbound_priority, send_document_safe, send_message_safe,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +26,19 @@ scheduler = AsyncIOScheduler()
 
 _bot = None
 _topic_ids = {}
+_alerts_enabled = True
 
 
 def init_scheduler(bot, topic_ids: dict):
-    global _bot, _topic_ids
+    global _bot, _topic_ids, _alerts_enabled
     _bot = bot
     _topic_ids = topic_ids
+    _alerts_enabled = db.settings.get("monitor_enabled")
+
+    db.settings.subscribe("monitor_enabled", _on_monitor_toggle)
+    db.settings.subscribe("payment_notify_enabled", _on_payment_notify_toggle)
+    for key in TOPIC_IDS:
+        db.settings.subscribe(f"topic_{key}", _on_topic_change)
 
     scheduler.add_job(
         monitoring_job,
@@ -31,6 +48,22 @@ def init_scheduler(bot, topic_ids: dict):
         replace_existing=True,
     )
 
+    scheduler.add_job(
+        latency_probe_job,
+        "interval",
+        seconds=LATENCY_PROBE_INTERVAL,
+        id="latency_probe",
+        replace_existing=True,
+    )
+
+    scheduler.add_job(
+        metrics_maintenance_job,
+        "cron",
+        minute=5,
+        id="metrics_maintenance",
+        replace_existing=True,
+    )
+
     scheduler.add_job(
         payment_reminder_job,
         "cron",
@@ -40,36 +73,144 @@ def init_scheduler(bot, topic_ids: dict):
         replace_existing=True,
     )
 
+    scheduler.add_job(
+        fsm_expiry_job,
+        "interval",
+        hours=1,
+        id="fsm_expiry",
+        replace_existing=True,
+    )
+
+    if DB_BACKUP_INTERVAL_HOURS > 0:
+        scheduler.add_job(
+            db_backup_job,
+            "interval",
+            hours=DB_BACKUP_INTERVAL_HOURS,
+            id="db_backup",
+            replace_existing=True,
+        )
+
     scheduler.start()
+    if not db.settings.get("payment_notify_enabled"):
+        scheduler.pause_job("payment_reminders")
     logger.info("Scheduler started")
 
 
+def _on_monitor_toggle(key: str, enabled: bool):
+    # Metrics are still collected for history; only the alerts stop
+    global _alerts_enabled
+    _alerts_enabled = enabled
+    logger.info(f"Monitoring alerts {'enabled' if enabled else 'disabled'}")
+
+
+def _on_payment_notify_toggle(key: str, enabled: bool):
+    if enabled:
+        scheduler.resume_job("payment_reminders")
+    else:
+        scheduler.pause_job("payment_reminders")
+    logger.info(f"Payment reminders {'enabled' if enabled else 'disabled'}")
+
+
+async def _on_topic_change(key: str, topic_id: int):
+    name = key.removeprefix("topic_")
+    if topic_id:
+        _topic_ids[name] = topic_id
+    else:
+        _topic_ids.pop(name, None)
+    if name == "monitoring":
+        # The pinned dashboard stays behind in the old topic
+        fleet_dashboard.reset()
+        await db.set_setting("dashboard_message_id", 0)
+
+
 async def monitoring_job():
     if not _bot or not GROUP_ID:
         return
 
     topic_id = _topic_ids.get("monitoring")
-    results = await monitoring_service.collect_all()
-    servers = await db.get_servers()
+    names = {s["id"]: s["name"] for s in await db.get_servers()}
+    collected = {}
+
+    alerts = []
+    async for sid, metrics in monitoring_service.iter_collect():
+        if not metrics:
+            continue
+        collected[sid] = metrics
+        if _alerts_enabled:
+            alerts.extend(monitoring_service.check_alerts(sid, names.get(sid, str(sid)), metrics))
+
+    # One digest per tick, however many servers are alerting
+    for text in format_alert_digest(alerts):
+        try:
+            with outbound_priority(Priority.ALERT):
+                await send_message_safe(
+                    _bot,
+                    chat_id=GROUP_ID,
+                    message_thread_id=topic_id,
+                    text=text,
+                    parse_mode="HTML",
+                )
+        except Exception as e:
+            logger.error(f"Failed to send alert digest: {e}")
 
-    for server in servers:
-        sid = server["id"]
-        metrics = results.get(sid)
+    try:
+        await monitoring_service.store_tick(collected)
+    except Exception as e:
+        logger.error(f"Failed to store metrics history: {e}")
 
-        if metrics:
-            alerts = monitoring_service.check_alerts(sid, server["name"], metrics)
-            for alert_text in alerts:
-                try:
-                    await send_message_safe(
-                        _bot,
-                        chat_id=GROUP_ID,
-                        message_thread_id=topic_id,
-                        text=alert_text,
-                        parse_mode="HTML",
-                    )
-                    await asyncio.sleep(0.2)
-                except Exception as e:
-                    logger.error(f"Failed to send alert: {e}")
+    if MONITOR_DASHBOARD_ENABLED:
+        try:
+            await fleet_dashboard.update(_bot, GROUP_ID, topic_id)
+        except Exception as e:
+            logger.error(f"Failed to update the fleet dashboard: {e}")
+
+
+async def latency_probe_job():
+    try:
+        await latency_prober.probe_all()
+    except Exception as e:
+        logger.error(f"Latency probe failed: {e}")
+
+
+async def metrics_maintenance_job():
+    try:
+        await monitoring_service.maintain_history()
+    except Exception as e:
+        logger.error(f"Metrics rollup failed: {e}")
+
+
+async def fsm_expiry_job():
+    try:
+        await fsm_storage.expire()
+    except Exception as e:
+        logger.error(f"FSM expiry failed: {e}")
+
+
+async def db_backup_job():
+    try:
+        archive = await create_backup()
+    except Exception as e:
+        logger.error(f"Database backup failed: {e}")
+        return
+
+    # The archive holds server credentials: sending it to the group is opt-in
+    if not DB_BACKUP_SEND or not _bot or not GROUP_ID:
+        return
+    if archive.stat().st_size > MAX_DOCUMENT_BYTES:
+        logger.warning(f"Backup {archive.name} is too large to send to Telegram")
+        return
+    try:
+        with outbound_priority(Priority.BULK):
+            await send_document_safe(
+                _bot,
+                chat_id=GROUP_ID,
+                message_thread_id=_topic_ids.get("admin"),
+                document=FSInputFile(archive),
+                caption=f"\U0001f4be <b>\u0411\u044d\u043a\u0430\u043f \u0411\u0414</b>: {archive.name}",
+                parse_mode="HTML",
+            )
+    except Exception as e:
+        logger.error(f"Failed to send database backup: {e}")
 
 
 async def payment_reminder_job():
@@ -89,13 +230,14 @@ async def payment_reminder_job():
         if days_left in REMINDER_DAYS and str(days_left) not in notified_list:
             text = format_payment_reminder(dict(payment), days_left)
             try:
-                await send_message_safe(
-                    _bot,
-                    chat_id=GROUP_ID,
-                    message_thread_id=topic_id,
-                    text=text,
-                    parse_mode="HTML",
-                )
+                with outbound_priority(Priority.REMINDER):
+                    await send_message_safe(
+                        _bot,
+                        chat_id=GROUP_ID,
+                        message_thread_id=topic_id,
+                        text=text,
+                        parse_mode="HTML",
+                    )
                 notified_list.append(str(days_left))
                 await db.update_payment_notified(
                     payment["id"], ",".join(notified_list)
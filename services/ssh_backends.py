@@ -0,0 +1,397 @@
+import asyncio
+import hashlib
+import io
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import paramiko
+
+try:
+    import asyncssh
+except ImportError:  # optional, paramiko is used as a fallback
+    asyncssh = None
+
+from config import SSH_POOL_IDLE_TIMEOUT, SSH_KEEPALIVE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 10
+
+
+def pool_key(server: dict) -> tuple:
+    """Pool key: server id plus a fingerprint of the connection credentials."""
+    fingerprint = hashlib.sha256("\0".join(
+        str(server.get(field) or "")
+        for field in ("host", "port", "username", "auth_type", "password", "ssh_key")
+    ).encode()).hexdigest()[:16]
+    server_id = server.get("id") or f"{server['host']}:{server['port']}"
+    return server_id, fingerprint
+
+
+class SSHBackend(ABC):
+    """Transport used by SSHManager. Implementations keep their own connection pool."""
+
+    name = "base"
+
+    @abstractmethod
+    async def run(self, server: dict, command: str, timeout: int) -> tuple[str, str, int]:
+        ...
+
+    @abstractmethod
+    async def open_stream(self, server: dict, command: str) -> "SSHStream":
+        """Start a long-lived command on the pooled connection and talk to it line by line."""
+
+    @abstractmethod
+    def drop(self, server_id):
+        ...
+
+    @abstractmethod
+    def close_all(self):
+        ...
+
+
+class SSHStream(ABC):
+    @property
+    @abstractmethod
+    def closed(self) -> bool:
+        ...
+
+    @abstractmethod
+    async def request(self, line: str, timeout: float) -> str:
+        """Write one line to the remote stdin and return the next stdout line."""
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+class _ParamikoStream(SSHStream):
+    def __init__(self, backend: "ParamikoBackend", key: tuple, channel: paramiko.Channel):
+        self._backend = backend
+        self._key = key
+        self._channel = channel
+        self._reader = channel.makefile("rb")
+
+    @property
+    def closed(self) -> bool:
+        return self._channel.closed or self._channel.exit_status_ready()
+
+    async def request(self, line: str, timeout: float) -> str:
+        def _io():
+            self._channel.settimeout(timeout)
+            self._channel.sendall((line + "\n").encode())
+            return self._reader.readline()
+
+        self._backend._touch(self._key)
+        out = await asyncio.get_running_loop().run_in_executor(None, _io)
+        if not out:
+            raise EOFError("stream closed by remote side")
+        return out.decode("utf-8", errors="replace").strip()
+
+    def close(self):
+        self._channel.close()
+
+
+class ParamikoBackend(SSHBackend):
+    """Blocking paramiko clients driven from the default thread pool."""
+
+    name = "paramiko"
+
+    def __init__(self):
+        self._connections: dict[tuple, paramiko.SSHClient] = {}
+        self._last_used: dict[tuple, float] = {}
+        self._pool_lock = threading.Lock()
+        self._key_locks: dict[tuple, threading.Lock] = {}
+
+    def _create_client(self, server: dict) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        connect_kwargs = {
+            "hostname": server["host"],
+            "port": server["port"],
+            "username": server["username"],
+            "timeout": CONNECT_TIMEOUT,
+        }
+
+        if server["auth_type"] == "key" and server.get("ssh_key"):
+            key_file = io.StringIO(server["ssh_key"])
+            try:
+                pkey = paramiko.RSAKey.from_private_key(key_file)
+            except paramiko.SSHException:
+                key_file.seek(0)
+                pkey = paramiko.Ed25519Key.from_private_key(key_file)
+            connect_kwargs["pkey"] = pkey
+        else:
+            connect_kwargs["password"] = server.get("password", "")
+
+        client.connect(**connect_kwargs)
+        transport = client.get_transport()
+        if transport:
+            transport.set_keepalive(SSH_KEEPALIVE_INTERVAL)
+        return client
+
+    @staticmethod
+    def _is_alive(client: paramiko.SSHClient) -> bool:
+        transport = client.get_transport()
+        if not transport or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            # Cheap round trip that fails fast on a half-open socket
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    def _acquire(self, server: dict, fresh: bool = False) -> tuple[paramiko.SSHClient, bool]:
+        """Return a pooled client for the server and whether it was just created."""
+        key = pool_key(server)
+        with self._pool_lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            client = self._connections.get(key)
+            if client and not fresh and self._is_alive(client):
+                self._last_used[key] = time.monotonic()
+                return client, False
+
+            self._discard(key)
+            client = self._create_client(server)
+            with self._pool_lock:
+                # Credentials changed: drop connections made with the old ones
+                stale = [k for k in self._connections if k[0] == key[0] and k != key]
+                self._connections[key] = client
+                self._last_used[key] = time.monotonic()
+            for k in stale:
+                self._discard(k)
+            return client, True
+
+    def _discard(self, key: tuple):
+        with self._pool_lock:
+            client = self._connections.pop(key, None)
+            self._last_used.pop(key, None)
+        if client:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def _touch(self, key: tuple):
+        with self._pool_lock:
+            if key in self._last_used:
+                self._last_used[key] = time.monotonic()
+
+    def _evict_idle(self):
+        deadline = time.monotonic() - SSH_POOL_IDLE_TIMEOUT
+        with self._pool_lock:
+            idle = [k for k, used in self._last_used.items() if used < deadline]
+        for key in idle:
+            logger.debug(f"Closing idle SSH connection {key[0]}")
+            self._discard(key)
+
+    def drop(self, server_id):
+        with self._pool_lock:
+            keys = [k for k in self._connections if k[0] == server_id]
+        for key in keys:
+            self._discard(key)
+
+    def close_all(self):
+        with self._pool_lock:
+            keys = list(self._connections)
+        for key in keys:
+            self._discard(key)
+
+    async def run(self, server: dict, command: str, timeout: int) -> tuple[str, str, int]:
+        def _run():
+            self._evict_idle()
+            try:
+                client, created = self._acquire(server)
+                try:
+                    stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                except (paramiko.SSHException, EOFError, OSError):
+                    if created:
+                        raise
+                    # Pooled transport died between the liveness check and the
+                    # channel open; the command never started, so reconnect once.
+                    client, _ = self._acquire(server, fresh=True)
+                    stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                stdout.channel.settimeout(timeout)
+                stderr.channel.settimeout(timeout)
+                try:
+                    exit_code = stdout.channel.recv_exit_status()
+                except Exception:
+                    exit_code = -1
+                try:
+                    out = stdout.read().decode("utf-8", errors="replace")
+                except Exception:
+                    out = "(timeout)"
+                try:
+                    err = stderr.read().decode("utf-8", errors="replace")
+                except Exception:
+                    err = ""
+                stdout.channel.close()
+                return out, err, exit_code
+            except Exception:
+                self._discard(pool_key(server))
+                raise
+
+        return await asyncio.get_running_loop().run_in_executor(None, _run)
+
+    async def open_stream(self, server: dict, command: str) -> SSHStream:
+        def _open():
+            client, _ = self._acquire(server)
+            channel = client.get_transport().open_session()
+            channel.exec_command(command)
+            return channel
+
+        channel = await asyncio.get_running_loop().run_in_executor(None, _open)
+        return _ParamikoStream(self, pool_key(server), channel)
+
+
+if asyncssh is not None:
+    class _TrackedClient(asyncssh.SSHClient):
+        def __init__(self):
+            self.closed = False
+
+        def connection_lost(self, exc):
+            self.closed = True
+
+
+class _AsyncSSHStream(SSHStream):
+    def __init__(self, backend: "AsyncSSHBackend", key: tuple, process):
+        self._backend = backend
+        self._key = key
+        self._process = process
+
+    @property
+    def closed(self) -> bool:
+        return self._process.exit_status is not None or self._process.stdout.at_eof()
+
+    async def request(self, line: str, timeout: float) -> str:
+        self._backend._touch(self._key)
+        self._process.stdin.write(line + "\n")
+        out = await asyncio.wait_for(self._process.stdout.readline(), timeout)
+        if not out:
+            raise EOFError("stream closed by remote side")
+        return out.strip()
+
+    def close(self):
+        self._process.close()
+
+
+class AsyncSSHBackend(SSHBackend):
+    """asyncssh connections multiplexed on the event loop, no worker threads."""
+
+    name = "asyncssh"
+
+    def __init__(self):
+        if asyncssh is None:
+            raise RuntimeError("asyncssh is not installed")
+        self._connections: dict[tuple, tuple] = {}
+        self._last_used: dict[tuple, float] = {}
+        self._key_locks: dict[tuple, asyncio.Lock] = {}
+
+    async def _create_connection(self, server: dict):
+        options = {
+            "username": server["username"],
+            "known_hosts": None,
+            "agent_path": None,
+            "connect_timeout": CONNECT_TIMEOUT,
+            "keepalive_interval": SSH_KEEPALIVE_INTERVAL,
+        }
+        if server["auth_type"] == "key" and server.get("ssh_key"):
+            options["client_keys"] = [asyncssh.import_private_key(server["ssh_key"])]
+            options["password"] = None
+        else:
+            options["client_keys"] = None
+            options["password"] = server.get("password", "")
+
+        return await asyncssh.create_connection(
+            _TrackedClient, server["host"], server["port"], **options
+        )
+
+    async def _acquire(self, server: dict, fresh: bool = False):
+        """Return a pooled connection for the server and whether it was just created."""
+        key = pool_key(server)
+        key_lock = self._key_locks.setdefault(key, asyncio.Lock())
+
+        async with key_lock:
+            entry = self._connections.get(key)
+            if entry and not fresh and not entry[1].closed:
+                self._last_used[key] = time.monotonic()
+                return entry[0], False
+
+            self._discard(key)
+            conn, client = await self._create_connection(server)
+            stale = [k for k in self._connections if k[0] == key[0] and k != key]
+            self._connections[key] = (conn, client)
+            self._last_used[key] = time.monotonic()
+            for k in stale:
+                self._discard(k)
+            return conn, True
+
+    def _discard(self, key: tuple):
+        entry = self._connections.pop(key, None)
+        self._last_used.pop(key, None)
+        if entry:
+            entry[0].close()
+
+    def _touch(self, key: tuple):
+        if key in self._last_used:
+            self._last_used[key] = time.monotonic()
+
+    def _evict_idle(self):
+        deadline = time.monotonic() - SSH_POOL_IDLE_TIMEOUT
+        for key in [k for k, used in self._last_used.items() if used < deadline]:
+            logger.debug(f"Closing idle SSH connection {key[0]}")
+            self._discard(key)
+
+    def drop(self, server_id):
+        for key in [k for k in self._connections if k[0] == server_id]:
+            self._discard(key)
+
+    def close_all(self):
+        for key in list(self._connections):
+            self._discard(key)
+
+    async def run(self, server: dict, command: str, timeout: int) -> tuple[str, str, int]:
+        self._evict_idle()
+        try:
+            conn, created = await self._acquire(server)
+            try:
+                process = await conn.create_process(command, errors="replace")
+            except (asyncssh.Error, OSError):
+                if created:
+                    raise
+                # Same rule as paramiko: only retry when the channel never opened
+                conn, _ = await self._acquire(server, fresh=True)
+                process = await conn.create_process(command, errors="replace")
+        except Exception:
+            self._discard(pool_key(server))
+            raise
+
+        try:
+            result = await asyncio.wait_for(process.wait(check=False), timeout)
+        except asyncio.TimeoutError:
+            process.close()
+            return "(timeout)", "", -1
+
+        exit_code = result.exit_status if result.exit_status is not None else -1
+        return result.stdout or "", result.stderr or "", exit_code
+
+    async def open_stream(self, server: dict, command: str) -> SSHStream:
+        conn, _ = await self._acquire(server)
+        process = await conn.create_process(command, errors="replace")
+        return _AsyncSSHStream(self, pool_key(server), process)
+
+
+def create_backend(name: str) -> SSHBackend:
+    if name == "asyncssh":
+        if asyncssh is not None:
+            return AsyncSSHBackend()
+        logger.warning("asyncssh is not installed, falling back to paramiko SSH backend")
+    elif name != "paramiko":
+        logger.warning(f"Unknown SSH_BACKEND '{name}', using paramiko")
+    return ParamikoBackend()
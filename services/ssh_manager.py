@@ -1,69 +1,55 @@
 import asyncio
-import io
-import paramiko
 import logging
 
+from config import SSH_BACKEND, MONITOR_AGENT_ENABLED
+from services.metrics_agent import agent_command, parse_frame
+from services.metrics_wire import METRICS_SCRIPT, parse_metrics
+from services.ssh_backends import SSHStream, create_backend, pool_key
+
 logger = logging.getLogger(__name__)
 
+METRIC_DEFAULTS = {
+    "cpu_percent": 0,
+    "cpu_iowait": 0,
+    "cpu_steal": 0,
+    "cpu_cores": 1,
+    "ram_total": 0,
+    "ram_used": 0,
+    "ram_percent": 0,
+    "disk_total": 0,
+    "disk_used": 0,
+    "disk_percent": 0,
+    "uptime": 0,
+    "net_upload": 0,
+    "net_download": 0,
+    "ping_ms": 0,
+}
+
 
 class SSHManager:
     def __init__(self):
-        self._connections: dict[int, paramiko.SSHClient] = {}
-
-    def _create_client(self, server: dict) -> paramiko.SSHClient:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-        connect_kwargs = {
-            "hostname": server["host"],
-            "port": server["port"],
-            "username": server["username"],
-            "timeout": 10,
-        }
-
-        if server["auth_type"] == "key" and server.get("ssh_key"):
-            key_file = io.StringIO(server["ssh_key"])
-            try:
-                pkey = paramiko.RSAKey.from_private_key(key_file)
-            except paramiko.SSHException:
-                key_file.seek(0)
-                pkey = paramiko.Ed25519Key.from_private_key(key_file)
-            connect_kwargs["pkey"] = pkey
-        else:
-            connect_kwargs["password"] = server.get("password", "")
-
-        client.connect(**connect_kwargs)
-        return client
+        self._backend = create_backend(SSH_BACKEND)
+        self._agents: dict[tuple, SSHStream] = {}
+        self._agent_locks: dict[tuple, asyncio.Lock] = {}
+        logger.info(f"SSH backend: {self._backend.name}")
+
+    def drop(self, server_id: int):
+        for key in [k for k in self._agents if k[0] == server_id]:
+            self._agents.pop(key).close()
+        self._backend.drop(server_id)
+
+    def close_all(self):
+        for stream in self._agents.values():
+            stream.close()
+        self._agents.clear()
+        self._backend.close_all()
 
     async def execute(self, server: dict, command: str, timeout: int = 30) -> tuple[str, str, int]:
-        def _run():
-            client = None
-            try:
-                client = self._create_client(server)
-                stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
-                stdout.channel.settimeout(timeout)
-                stderr.channel.settimeout(timeout)
-                try:
-                    exit_code = stdout.channel.recv_exit_status()
-                except Exception:
-                    exit_code = -1
-                try:
-                    out = stdout.read().decode("utf-8", errors="replace")
-                except Exception:
-                    out = "(timeout)"
-                try:
-                    err = stderr.read().decode("utf-8", errors="replace")
-                except Exception:
-                    err = ""
-                return out, err, exit_code
-            except Exception as e:
-                logger.error(f"SSH error for {server['host']}: {e}")
-                return "", str(e), -1
-            finally:
-                if client:
-                    client.close()
-
-        return await asyncio.get_event_loop().run_in_executor(None, _run)
+        try:
+            return await self._backend.run(server, command, timeout)
+        except Exception as e:
+            logger.error(f"SSH error for {server['host']}: {e}")
+            return "", str(e), -1
 
     async def check_connection(self, server: dict) -> bool:
         try:
@@ -72,89 +58,51 @@ class SSHManager:
         except Exception:
             return False
 
+    async def _poll_agent(self, server: dict, timeout: int = 10) -> dict | None:
+        key = pool_key(server)
+        async with self._agent_locks.setdefault(key, asyncio.Lock()):
+            stream = self._agents.get(key)
+            try:
+                if stream is None or stream.closed:
+                    stream = await self._backend.open_stream(server, agent_command())
+                    self._agents[key] = stream
+                frame = await stream.request("", timeout)
+                metrics = parse_frame(frame)
+            except asyncio.CancelledError:
+                # A half-read frame would desync the next request
+                if stream:
+                    stream.close()
+                self._agents.pop(key, None)
+                raise
+            except Exception as e:
+                logger.warning(f"Metrics agent on {server['host']} unavailable: {e}")
+                if stream:
+                    stream.close()
+                self._agents.pop(key, None)
+                return None
+
+        for field, value in METRIC_DEFAULTS.items():
+            metrics.setdefault(field, value)
+        return metrics
+
     async def get_metrics(self, server: dict) -> dict | None:
-        command = """
-        echo "===CPU==="
-        cat /proc/loadavg
-        nproc
-        echo "===MEM==="
-        free -b | grep Mem
-        echo "===DISK==="
-        df -B1 / | tail -1
-        echo "===NET==="
-        cat /proc/net/dev | grep -E "eth0|ens|enp" | head -1
-        echo "===UPTIME==="
-        cat /proc/uptime
-        echo "===CPU_PERCENT==="
-        top -bn1 | grep "Cpu(s)" | awk '{print $2}'
-        """
-
-        out, err, code = await self.execute(server, command, timeout=15)
+        if MONITOR_AGENT_ENABLED:
+            metrics = await self._poll_agent(server)
+            if metrics:
+                return metrics
+
+        out, err, code = await self.execute(server, METRICS_SCRIPT, timeout=15)
         if code != 0:
             return None
 
-        try:
-            return self._parse_metrics(out)
-        except Exception as e:
-            logger.error(f"Parse metrics error: {e}")
+        metrics, errors = parse_metrics(out)
+        if errors:
+            logger.warning(f"Metrics from {server['host']}: {'; '.join(errors)}")
+        if metrics is None:
             return None
 
-    def _parse_metrics(self, output: str) -> dict:
-        metrics = {}
-        sections = output.split("===")
-
-        for i, section in enumerate(sections):
-            section = section.strip()
-            if not section:
-                continue
-
-            if section == "CPU":
-                lines = sections[i + 1].strip().split("\n")
-                if len(lines) >= 2:
-                    load = lines[0].split()
-                    metrics["load_1m"] = float(load[0])
-                    metrics["cpu_cores"] = int(lines[1].strip())
-
-            elif section == "MEM":
-                line = sections[i + 1].strip()
-                parts = line.split()
-                if len(parts) >= 3:
-                    metrics["ram_total"] = int(parts[1])
-                    metrics["ram_used"] = int(parts[2])
-                    metrics["ram_percent"] = (metrics["ram_used"] / metrics["ram_total"] * 100) if metrics["ram_total"] else 0
-
-            elif section == "DISK":
-                line = sections[i + 1].strip()
-                parts = line.split()
-                if len(parts) >= 4:
-                    metrics["disk_total"] = int(parts[1])
-                    metrics["disk_used"] = int(parts[2])
-                    metrics["disk_percent"] = (metrics["disk_used"] / metrics["disk_total"] * 100) if metrics["disk_total"] else 0
-
-            elif section == "UPTIME":
-                line = sections[i + 1].strip()
-                metrics["uptime"] = int(float(line.split()[0]))
-
-            elif section == "CPU_PERCENT":
-                line = sections[i + 1].strip()
-                try:
-                    metrics["cpu_percent"] = float(line.replace(",", "."))
-                except ValueError:
-                    metrics["cpu_percent"] = metrics.get("load_1m", 0) / max(metrics.get("cpu_cores", 1), 1) * 100
-
-        metrics.setdefault("cpu_percent", 0)
-        metrics.setdefault("cpu_cores", 1)
-        metrics.setdefault("ram_total", 0)
-        metrics.setdefault("ram_used", 0)
-        metrics.setdefault("ram_percent", 0)
-        metrics.setdefault("disk_total", 0)
-        metrics.setdefault("disk_used", 0)
-        metrics.setdefault("disk_percent", 0)
-        metrics.setdefault("uptime", 0)
-        metrics.setdefault("net_upload", 0)
-        metrics.setdefault("net_download", 0)
-        metrics.setdefault("ping_ms", 0)
-
+        for field, value in METRIC_DEFAULTS.items():
+            metrics.setdefault(field, value)
         return metrics
 
     async def change_password(self, server: dict, new_password: str) -> tuple[bool, str]:
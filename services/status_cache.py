@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from config import STATUS_TTL, STATUS_STALE_TTL
+from services.ssh_manager import ssh_manager
+
+
+class StatusCache:
+    """Last known online/offline state per server.
+
+    Fed by the monitoring tick and the latency prober. Entries younger than
+    STATUS_TTL are fresh; up to STATUS_STALE_TTL they are still served but the
+    caller should revalidate in the background; older entries count as unknown.
+    """
+
+    def __init__(self):
+        # server_id -> (online, monotonic time of the observation)
+        self._entries: dict[int, tuple[bool, float]] = {}
+        self._pending: dict[int, asyncio.Task] = {}
+
+    def set(self, server_id: int, online: bool):
+        self._entries[server_id] = (online, time.monotonic())
+
+    def set_reachable(self, server_id: int, reachable: bool):
+        """Apply a TCP probe result.
+
+        An open port does not prove SSH works, so a successful probe only
+        extends an existing Online entry; a failed one always means Offline.
+        """
+        if not reachable:
+            self.set(server_id, False)
+        elif self._entries.get(server_id, (False, 0))[0]:
+            self.set(server_id, True)
+
+    def get(self, server_id: int) -> tuple[bool | None, float | None]:
+        """(online, age in seconds), or (None, None) when unknown or expired."""
+        entry = self._entries.get(server_id)
+        if not entry:
+            return None, None
+        age = time.monotonic() - entry[1]
+        if age >= STATUS_STALE_TTL:
+            return None, None
+        return entry[0], age
+
+    @staticmethod
+    def is_fresh(age: float | None) -> bool:
+        return age is not None and age < STATUS_TTL
+
+    async def refresh(self, server: dict) -> bool:
+        """Check the server over SSH; concurrent callers share one check."""
+        server_id = server["id"]
+        task = self._pending.get(server_id)
+        if task is None:
+            task = asyncio.create_task(ssh_manager.check_connection(server))
+            self._pending[server_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(server_id, None))
+        # A caller going away must not cancel the check for the others
+        online = await asyncio.shield(task)
+        self.set(server_id, online)
+        return online
+
+    def forget(self, server_id: int):
+        self._entries.pop(server_id, None)
+
+
+status_cache = StatusCache()
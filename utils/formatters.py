@@ -1,5 +1,8 @@
 from datetime import datetime, timedelta
 
+# Telegram rejects messages longer than this
+MESSAGE_MAX_CHARS = 4096
+
 
 def progress_bar(percent: float, length: int = 10) -> str:
     filled = int(length * percent / 100)
@@ -48,6 +51,9 @@ def format_server_status(server: dict, metrics: dict = None) -> str:
 
     cpu = metrics.get("cpu_percent", 0)
     cpu_cores = metrics.get("cpu_cores", 0)
+    cpu_iowait = metrics.get("cpu_iowait", 0)
+    cpu_steal = metrics.get("cpu_steal", 0)
+    per_core = metrics.get("cpu_per_core") or []
     ram_used = metrics.get("ram_used", 0)
     ram_total = metrics.get("ram_total", 0)
     ram_percent = metrics.get("ram_percent", 0)
@@ -59,21 +65,157 @@ def format_server_status(server: dict, metrics: dict = None) -> str:
     uptime = metrics.get("uptime", 0)
     ping_ms = metrics.get("ping_ms", 0)
 
+    if "ping_avg" in metrics:
+        ping = (
+            f"{ping_ms:.0f}ms \u2022 min {metrics['ping_min']:.0f} \u2022 avg {metrics['ping_avg']:.0f} "
+            f"\u2022 p95 {metrics['ping_p95']:.0f} \u2022 jitter {metrics['ping_jitter']:.0f}"
+        )
+        if metrics.get("ping_loss"):
+            ping += f" \u2022 loss {metrics['ping_loss']:.0f}%"
+    elif metrics.get("ping_loss"):
+        ping = "\u043d\u0435\u0442 \u043e\u0442\u0432\u0435\u0442\u0430"
+    else:
+        ping = "\u2014"
+
+    cpu_details = f"   iowait {cpu_iowait:.0f}% \u2022 steal {cpu_steal:.0f}%\n"
+    if 1 < len(per_core) <= 16:
+        cpu_details += f"   \u042f\u0434\u0440\u0430: {' '.join(f'{c:.0f}' for c in per_core)}%\n"
+
     return (
         f"\U0001f4ca <b>\u041c\u043e\u043d\u0438\u0442\u043e\u0440\u0438\u043d\u0433 \u2014 {name}</b>\n"
         f"\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n"
         f"\U0001f5a5 CPU: {cpu:.0f}% {progress_bar(cpu)} {cpu_cores} \u044f\u0434\u0435\u0440\n"
+        f"{cpu_details}"
         f"\U0001f9e0 RAM: {ram_percent:.0f}% {progress_bar(ram_percent)} {format_bytes(ram_used)}/{format_bytes(ram_total)}\n"
         f"\U0001f4be Disk: {disk_percent:.0f}% {progress_bar(disk_percent)} {format_bytes(disk_used)}/{format_bytes(disk_total)}\n"
         f"\U0001f310 Network: \u2191 {format_bytes(net_up)}/s \u2193 {format_bytes(net_down)}/s\n"
         f"\u23f1 Uptime: {format_uptime(uptime)}\n"
-        f"\U0001f4e1 Ping: {ping_ms}ms\n"
+        f"\U0001f4e1 Ping: {ping}\n"
         f"\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n"
         f"\U0001f7e2 \u0421\u0442\u0430\u0442\u0443\u0441: <b>Online</b>\n"
         f"\U0001f550 \u041e\u0431\u043d\u043e\u0432\u043b\u0435\u043d\u043e: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
     )
 
 
+def format_metrics_history(server: dict, summaries: list[tuple[str, dict | None]]) -> str:
+    text = (
+        f"\U0001f4c8 <b>\u0418\u0441\u0442\u043e\u0440\u0438\u044f \u2014 {server.get('name', 'Unknown')}</b>\n"
+        f"\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n"
+    )
+    for label, summary in summaries:
+        text += f"\n<b>{label}</b>\n"
+        if not summary:
+            text += "   \u041d\u0435\u0442 \u0434\u0430\u043d\u043d\u044b\u0445\n"
+            continue
+        disk_delta = summary["disk_last"] - summary["disk_first"]
+        text += (
+            f"   \U0001f5a5 CPU: avg {summary['cpu_avg']:.0f}% \u2022 p95 {summary['cpu_p95']:.0f}% \u2022 max {summary['cpu_max']:.0f}%\n"
+            f"   \U0001f9e0 RAM: avg {summary['ram_avg']:.0f}% \u2022 p95 {summary['ram_p95']:.0f}% \u2022 max {summary['ram_max']:.0f}%\n"
+            f"   \U0001f4be Disk: {summary['disk_last']:.0f}% ({disk_delta:+.1f}%)\n"
+        )
+    return text
+
+
+_SEVERITY_HEADERS = {
+    "critical": "\U0001f534 <b>\u041a\u0440\u0438\u0442\u0438\u0447\u043d\u043e</b>",
+    "warning": "\U0001f7e1 <b>\u041f\u0440\u0435\u0434\u0443\u043f\u0440\u0435\u0436\u0434\u0435\u043d\u0438\u044f</b>",
+}
+
+
+def format_alert_digest(alerts: list[dict]) -> list[str]:
+    """All new alerts of one monitoring tick, split into Telegram-sized messages.
+
+    Alerts are grouped by severity, then by server (one line per server).
+    A delivered alert shows the repeats suppressed since its last delivery;
+    the footer counts only the alerts suppressed in this tick, so no repeat
+    is counted twice. Returns [] when nothing is new.
+    """
+    new = [a for a in alerts if not a["suppressed"]]
+    if not new:
+        return []
+    suppressed = sum(1 for a in alerts if a["suppressed"])
+
+    lines: list[tuple[str, str]] = []  # (section header, line)
+    for severity, header in _SEVERITY_HEADERS.items():
+        by_server: dict[str, list[str]] = {}
+        for a in new:
+            if a["severity"] != severity:
+                continue
+            item = f"{a['label']} <b>{a['value']:.0f}%</b> (>\u2009{a['threshold']}%)"
+            if a["repeats"]:
+                item += f" +{a['repeats']} \u043f\u043e\u0432\u0442."
+            by_server.setdefault(a["server"], []).append(item)
+        for server, items in sorted(by_server.items()):
+            lines.append((header, f"\U0001f5a5 <b>{server}</b>: " + " \u2022 ".join(items)))
+
+    servers = len({a["server"] for a in new})
+    title = f"\u26a0\ufe0f <b>\u0410\u043b\u0435\u0440\u0442\u044b: {len(new)} \u043d\u0430 {servers} \u0441\u0435\u0440\u0432.</b>"
+    footer = f"\n\U0001f507 \u041f\u043e\u0434\u0430\u0432\u043b\u0435\u043d\u043e \u043f\u043e\u0432\u0442\u043e\u0440\u043e\u0432: {suppressed}" if suppressed else ""
+
+    # Leave room for the " (i/n)" part counter added below
+    limit = MESSAGE_MAX_CHARS - 16
+    chunks: list[str] = []
+    text, section = title + "\n", None
+    for header, line in lines:
+        block = (f"\n{header}\n" if header != section else "") + line + "\n"
+        if len(text) + len(block) > limit:
+            chunks.append(text)
+            text = title + "\n" + f"\n{header}\n" + line + "\n"
+        else:
+            text += block
+        section = header
+    if len(text) + len(footer) > limit:
+        chunks.append(text)
+        text = title + "\n"
+    chunks.append(text + footer)
+
+    if len(chunks) > 1:
+        chunks = [
+            chunk.replace(title, f"{title} ({i}/{len(chunks)})", 1)
+            for i, chunk in enumerate(chunks, 1)
+        ]
+    return chunks
+
+
+def format_fleet_dashboard(rows: list[tuple[dict, bool | None, dict | None]]) -> str:
+    """One line per server from cached state: (server, online, metrics).
+
+    Nothing time-dependent is rendered here, so an unchanged fleet renders
+    to the same text.
+    """
+    online = sum(1 for _, state, _ in rows if state)
+    offline = sum(1 for _, state, _ in rows if state is False)
+    header = (
+        f"\U0001f4ca <b>\u0421\u0435\u0440\u0432\u0435\u0440\u044b</b> \u2022 \U0001f7e2 {online} \u2022 \U0001f534 {offline} \u2022 \u26aa {len(rows) - online - offline}\n"
+        f"\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\u2501\n"
+    )
+    if not rows:
+        return header + "\n\u041d\u0435\u0442 \u0434\u043e\u0431\u0430\u0432\u043b\u0435\u043d\u043d\u044b\u0445 \u0441\u0435\u0440\u0432\u0435\u0440\u043e\u0432.\n"
+
+    lines = []
+    for server, state, metrics in rows:
+        if state and metrics:
+            line = (
+                f"\U0001f7e2 <b>{server['name']}</b> CPU {metrics.get('cpu_percent', 0):.0f}% \u2022 "
+                f"RAM {metrics.get('ram_percent', 0):.0f}% \u2022 Disk {metrics.get('disk_percent', 0):.0f}%"
+            )
+            if metrics.get("ping_ms"):
+                line += f" \u2022 {metrics['ping_ms']:.0f}ms"
+        elif state is False:
+            line = f"\U0001f534 <b>{server['name']}</b> \u2014 Offline"
+        else:
+            line = f"\u26aa <b>{server['name']}</b> \u2014 \u043d\u0435\u0442 \u0434\u0430\u043d\u043d\u044b\u0445"
+        lines.append(line + "\n")
+
+    # Leave room for the footer the caller appends
+    text, limit = header, MESSAGE_MAX_CHARS - 200
+    for shown, line in enumerate(lines):
+        if len(text) + len(line) > limit:
+            return text + f"\u2026 \u0438 \u0435\u0449\u0451 {len(lines) - shown}\n"
+        text += line
+    return text
+
+
 def format_payment_reminder(payment: dict, days_left: int) -> str:
     desc = payment.get("description", "")
     amount = payment.get("amount", 0)
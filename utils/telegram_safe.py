@@ -1,12 +1,360 @@
 import asyncio
+import hashlib
 import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
 from typing import Any
 
-from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
 from aiogram.types import Message
 
+from config import TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_GROUP_PER_MINUTE
+from utils.stats import percentile
+
 logger = logging.getLogger(__name__)
 _PATCHED_MESSAGE_EDIT = False
+# Bot API limit for documents uploaded by bots
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+_REVISIONS_MAX = 2048
+_message_revisions: OrderedDict[tuple[int, int], int] = OrderedDict()
+# (chat_id, message_id) -> hash of the text and markup last sent by an edit
+_RENDERED_MAX = 2048
+_rendered: OrderedDict[tuple[int, int], bytes] = OrderedDict()
+_edit_cache_hits = 0
+_edit_cache_misses = 0
+
+
+def message_revision(chat_id: int, message_id: int) -> int:
+    """Number of edits made to the message through the helpers in this module.
+
+    Background tasks compare it before and after slow work so they do not
+    overwrite a screen the user has already navigated away from.
+    """
+    return _message_revisions.get((chat_id, message_id), 0)
+
+
+def _bump_revision(chat_id, message_id) -> None:
+    if chat_id is None or message_id is None:
+        return
+    key = (chat_id, message_id)
+    _message_revisions[key] = _message_revisions.pop(key, 0) + 1
+    if len(_message_revisions) > _REVISIONS_MAX:
+        _message_revisions.popitem(last=False)
+
+
+def _render_hash(args: tuple, kwargs: dict) -> bytes:
+    """Hash of everything an editMessageText call would put on screen."""
+    parts = [repr(args)]
+    for name, value in sorted(kwargs.items()):
+        if name in ("chat_id", "message_id"):
+            continue
+        if hasattr(value, "model_dump_json"):
+            value = value.model_dump_json(exclude_none=True)
+        parts.append(f"{name}={value!r}")
+    return hashlib.blake2b("\0".join(parts).encode(), digest_size=16).digest()
+
+
+def _is_rendered(chat_id, message_id, digest: bytes) -> bool:
+    """True when the message already shows exactly this content."""
+    global _edit_cache_hits, _edit_cache_misses
+    key = (chat_id, message_id)
+    if chat_id is not None and message_id is not None and _rendered.get(key) == digest:
+        _rendered.move_to_end(key)
+        _edit_cache_hits += 1
+        return True
+    _edit_cache_misses += 1
+    return False
+
+
+def _remember_rendered(chat_id, message_id, digest: bytes) -> None:
+    if chat_id is None or message_id is None:
+        return
+    key = (chat_id, message_id)
+    _rendered[key] = digest
+    _rendered.move_to_end(key)
+    if len(_rendered) > _RENDERED_MAX:
+        _rendered.popitem(last=False)
+
+
+def _forget_rendered(chat_id, message_id) -> None:
+    _rendered.pop((chat_id, message_id), None)
+
+
+def edit_cache_stats() -> dict:
+    """Edits skipped because the message already showed that content, and the rest."""
+    return {"hits": _edit_cache_hits, "misses": _edit_cache_misses, "size": len(_rendered)}
+
+
+def _not_modified(error: TelegramBadRequest) -> bool:
+    return "message is not modified" in str(error)
+
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``capacity`` of them banked.
+
+    ``delay`` peeks at when the next token is due; ``reserve`` takes one,
+    even from an empty bucket, and returns the debt to sleep off.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, now: float) -> float:
+        """Take one token; returns how long to wait before using it."""
+        self._refill(now)
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def delay(self, now: float) -> float:
+        """How long until a token is available, without taking it."""
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def block(self, now: float, seconds: float):
+        """Hand out nothing for the next ``seconds``."""
+        self._refill(now)
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+
+class OutboundLimiter:
+    """Token buckets for Telegram's global, per-chat and per-group limits.
+
+    A request may go out once the global bucket and its chat's bucket both
+    have a token. Groups (negative chat ids) get the stricter per-minute bucket.
+    """
+
+    _CHATS_MAX = 1024
+
+    def __init__(self):
+        self._global = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE)
+        self._chats: OrderedDict[int | str, TokenBucket] = OrderedDict()
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.pop(chat_id, None)
+        if bucket is None:
+            if isinstance(chat_id, str) or chat_id < 0:
+                bucket = TokenBucket(TG_GROUP_PER_MINUTE / 60, TG_GROUP_PER_MINUTE)
+            else:
+                bucket = TokenBucket(TG_CHAT_RATE, TG_CHAT_BURST)
+        self._chats[chat_id] = bucket
+        if len(self._chats) > self._CHATS_MAX:
+            # Evict an idle chat; a full bucket carries no state worth keeping
+            now = time.monotonic()
+            for key, old in self._chats.items():
+                if old.is_full(now):
+                    del self._chats[key]
+                    break
+        return bucket
+
+    def delay(self, chat_id=None) -> float:
+        """Seconds until a request to ``chat_id`` (or any chat) may go out."""
+        now = time.monotonic()
+        wait = self._global.delay(now)
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).delay(now))
+        return wait
+
+    def take(self, chat_id):
+        """Spend the global token and the chat's token; check ``delay`` first."""
+        now = time.monotonic()
+        self._global.reserve(now)
+        if chat_id is not None:
+            self._chat_bucket(chat_id).reserve(now)
+
+    def record_wait(self, wait: float):
+        """Count time the dispatcher spent waiting for a token."""
+        self.throttled += 1
+        self.wait_seconds += wait
+
+    def penalize(self, chat_id, seconds: float):
+        """Telegram asked us to back off: hold the chat, or everything when unknown."""
+        bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+        bucket.block(time.monotonic(), seconds)
+
+
+outbound_limiter = OutboundLimiter()
+
+
+class Priority(IntEnum):
+    ALERT = 0
+    REMINDER = 1
+    INTERACTIVE = 2
+    BULK = 3
+
+
+# Requests queued per class; producers wait while their class is full
+_QUEUE_LIMITS = {Priority.ALERT: 1000, Priority.REMINDER: 500, Priority.INTERACTIVE: 200, Priority.BULK: 50}
+_LATENCY_WINDOW = 500
+
+_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def outbound_priority(priority: Priority):
+    """Send everything in this block (and the tasks it starts) with ``priority``."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class OutboundDispatcher:
+    """Hands out the send budget by priority class.
+
+    Requests wait in per-chat queues, one per class. A single worker looks
+    only at chats whose bucket has a token, starts the most urgent (then
+    oldest) request among them and spends the global and chat tokens on it.
+    So within one chat an alert goes out before bulk traffic queued earlier,
+    and a throttled group never holds up other chats.
+    """
+
+    def __init__(self):
+        # chat_id -> class -> (enqueued, call, future); only chats with requests
+        self._pending: dict[int | str | None, dict[Priority, deque]] = {}
+        self._slots = {priority: asyncio.Semaphore(limit) for priority, limit in _QUEUE_LIMITS.items()}
+        self._queued = {priority: 0 for priority in Priority}
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        # queueing delay samples in seconds, per class
+        self._latency = {priority: deque(maxlen=_LATENCY_WINDOW) for priority in Priority}
+        self._sent = {priority: 0 for priority in Priority}
+
+    async def submit(self, chat_id, call, priority: Priority | None = None):
+        """Run ``call()`` (a coroutine factory) once the limits allow; returns its result."""
+        if priority is None:
+            priority = _priority.get()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+        await self._slots[priority].acquire()
+        future = asyncio.get_running_loop().create_future()
+        queues = self._pending.setdefault(chat_id, {p: deque() for p in Priority})
+        queues[priority].append((time.monotonic(), call, future))
+        self._queued[priority] += 1
+        self._wakeup.set()
+        return await future
+
+    def _pop(self, chat_id, priority: Priority):
+        queues = self._pending[chat_id]
+        request = queues[priority].popleft()
+        if not any(queues.values()):
+            del self._pending[chat_id]
+        self._queued[priority] -= 1
+        self._slots[priority].release()
+        return request
+
+    def _next(self):
+        """The most urgent request of a chat that can send now, or how long to sleep."""
+        best = None
+        sleep = None
+        for chat_id, queues in list(self._pending.items()):
+            while True:
+                priority = next((p for p in Priority if queues[p]), None)
+                if priority is None or not queues[priority][0][2].done():
+                    break
+                # The caller gave up (cancelled) while queued
+                self._pop(chat_id, priority)
+            if priority is None:
+                continue
+            enqueued = queues[priority][0][0]
+            wait = outbound_limiter.delay(chat_id)
+            if wait > 0:
+                sleep = wait if sleep is None else min(sleep, wait)
+            elif best is None or (priority, enqueued) < best[:2]:
+                best = (priority, enqueued, chat_id)
+        if best is None:
+            return None, sleep
+        priority, _, chat_id = best
+        return (priority, chat_id, self._pop(chat_id, priority)), None
+
+    async def _work(self):
+        while True:
+            item, sleep = self._next()
+            if item is None:
+                self._wakeup.clear()
+                started = time.monotonic()
+                try:
+                    # A new request may be for a chat that is ready right now
+                    await asyncio.wait_for(self._wakeup.wait(), sleep)
+                except asyncio.TimeoutError:
+                    pass
+                if sleep is not None:
+                    outbound_limiter.record_wait(time.monotonic() - started)
+                continue
+            priority, chat_id, request = item
+            outbound_limiter.take(chat_id)
+            task = asyncio.create_task(self._run(priority, chat_id, *request))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, priority: Priority, chat_id, enqueued: float, call, future: asyncio.Future):
+        try:
+            self._latency[priority].append(time.monotonic() - enqueued)
+            self._sent[priority] += 1
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, TelegramRetryAfter):
+                outbound_limiter.penalize(chat_id, float(e.retry_after))
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict[Priority, dict]:
+        """Per class: requests sent, currently queued and queueing delay in ms."""
+        result = {}
+        for priority in Priority:
+            samples = list(self._latency[priority])
+            result[priority] = {
+                "sent": self._sent[priority],
+                "queued": self._queued[priority],
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p95_ms": percentile(samples, 95) * 1000,
+                "max_ms": max(samples, default=0) * 1000,
+            }
+        return result
+
+
+outbound_dispatcher = OutboundDispatcher()
+
+# Bot API methods that post or change chat content and count against the limits
+_LIMITED_METHODS = ("send", "edit", "copy", "forward")
+
+
+class OutboundRateLimit(BaseRequestMiddleware):
+    """Session middleware routing every send and edit through ``outbound_dispatcher``."""
+
+    async def __call__(self, make_request, bot, method):
+        if method.__api_method__ != "editMessageText" and method.__api_method__.startswith(("edit", "delete")):
+            # Changed behind the edit-text helpers: their cached render is stale
+            _forget_rendered(getattr(method, "chat_id", None), getattr(method, "message_id", None))
+        if not method.__api_method__.startswith(_LIMITED_METHODS):
+            return await make_request(bot, method)
+        return await outbound_dispatcher.submit(
+            getattr(method, "chat_id", None), lambda: make_request(bot, method)
+        )
 
 
 async def send_message_safe(bot, *args: Any, **kwargs: Any):
@@ -27,13 +375,45 @@ async def send_message_safe(bot, *args: Any, **kwargs: Any):
             await asyncio.sleep(0.7 * attempt)
 
 
+async def send_document_safe(bot, *args: Any, **kwargs: Any):
+    """Send Telegram document with retry for flood/network errors."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await bot.send_document(*args, **kwargs)
+        except TelegramRetryAfter as e:
+            wait_for = float(getattr(e, "retry_after", 1)) + 0.2
+            logger.warning("Flood control hit on document. Sleeping %.1fs before retry", wait_for)
+            await asyncio.sleep(wait_for)
+        except TelegramNetworkError:
+            if attempt >= 3:
+                raise
+            await asyncio.sleep(0.7 * attempt)
+
+
 async def edit_message_text_safe(bot, *args: Any, **kwargs: Any):
-    """Edit Telegram message with retry for flood/network errors."""
+    """Edit Telegram message with retry for flood/network errors.
+
+    An edit that would not change the message is skipped and returns True.
+    """
+    chat_id, message_id = kwargs.get("chat_id"), kwargs.get("message_id")
+    _bump_revision(chat_id, message_id)
+    digest = _render_hash(args, kwargs)
+    if _is_rendered(chat_id, message_id, digest):
+        return True
     attempt = 0
     while True:
         attempt += 1
         try:
-            return await bot.edit_message_text(*args, **kwargs)
+            result = await bot.edit_message_text(*args, **kwargs)
+            _remember_rendered(chat_id, message_id, digest)
+            return result
+        except TelegramBadRequest as e:
+            if not _not_modified(e):
+                raise
+            _remember_rendered(chat_id, message_id, digest)
+            return True
         except TelegramRetryAfter as e:
             wait_for = float(getattr(e, "retry_after", 1)) + 0.2
             logger.warning("Flood control hit on edit. Sleeping %.1fs before retry", wait_for)
@@ -45,7 +425,8 @@ async def edit_message_text_safe(bot, *args: Any, **kwargs: Any):
 
 
 def patch_aiogram_message_edit_text() -> None:
-    """Patch Message.edit_text globally to auto-retry on flood/network errors."""
+    """Patch Message.edit_text globally to auto-retry on flood/network errors
+    and to skip edits that would not change the message."""
     global _PATCHED_MESSAGE_EDIT
     if _PATCHED_MESSAGE_EDIT:
         return
@@ -53,11 +434,23 @@ def patch_aiogram_message_edit_text() -> None:
     original_edit_text = Message.edit_text
 
     async def _edit_text_with_retry(self, *args: Any, **kwargs: Any):
+        chat_id, message_id = self.chat.id, self.message_id
+        _bump_revision(chat_id, message_id)
+        digest = _render_hash(args, kwargs)
+        if _is_rendered(chat_id, message_id, digest):
+            return self
         attempt = 0
         while True:
             attempt += 1
             try:
-                return await original_edit_text(self, *args, **kwargs)
+                result = await original_edit_text(self, *args, **kwargs)
+                _remember_rendered(chat_id, message_id, digest)
+                return result
+            except TelegramBadRequest as e:
+                if not _not_modified(e):
+                    raise
+                _remember_rendered(chat_id, message_id, digest)
+                return self
             except TelegramRetryAfter as e:
                 wait_for = float(getattr(e, "retry_after", 1)) + 0.2
                 logger.warning("Flood control hit on Message.edit_text. Sleeping %.1fs before retry", wait_for)